@@ -0,0 +1,22 @@
+"""
+Ядро Grapth Researcher без Qt: данные графиков, единицы, запросы диапазонов, загрузка CSV,
+формат проекта и кэши. Интерфейс (main.py) строится поверх него; пакет можно импортировать
+в скриптах и пакетных заданиях, где нет ни Qt, ни дисплея.
+"""
+from .graph import (
+    UNITS, COLUMN_STATS, PROJECT_FIELDS, GraphData, UnitTransform, register_unit, unit_transform,
+    column_stats, MinMaxPyramid, TransformCache, TRANSFORM_CACHE, SpeciesIndex,
+)
+from .storage import (
+    CSV_CHUNK_SIZE, AUTOSAVE_DIR, LoadCanceled, CsvCache, CSV_CACHE, load_csv, load_csv_file, CsvTail,
+    read_project, write_project, write_project_file, append_project_changes, map_project_arrays,
+    project_needs_compaction, snapshot_graphs, write_autosave, remove_autosave, array_is_mapped, MemoryManager,
+)
+
+__all__ = [
+    'UNITS', 'COLUMN_STATS', 'PROJECT_FIELDS', 'GraphData', 'UnitTransform', 'register_unit', 'unit_transform',
+    'column_stats', 'MinMaxPyramid', 'TransformCache', 'TRANSFORM_CACHE', 'SpeciesIndex',
+    'CSV_CHUNK_SIZE', 'AUTOSAVE_DIR', 'LoadCanceled', 'CsvCache', 'CSV_CACHE', 'load_csv', 'load_csv_file', 'CsvTail',
+    'read_project', 'write_project', 'write_project_file', 'append_project_changes', 'map_project_arrays',
+    'project_needs_compaction', 'snapshot_graphs', 'write_autosave', 'remove_autosave', 'array_is_mapped', 'MemoryManager',
+]
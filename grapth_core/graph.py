@@ -0,0 +1,877 @@
+"""
+Модель данных графиков: разреженное хранение столбцов (GraphData), единицы, статистика столбцов,
+пирамиды детализации и запросы диапазонов, индекс соединений.
+Модуль не зависит от Qt.
+"""
+import uuid
+import bisect
+import fnmatch
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd  # Только для аннотаций: pandas загружается долго и нужен лишь при чтении CSV
+
+UNITS = ['y', 'ln(y)', 'lg(y)']  # Новые единицы добавляются через register_unit
+LOD_BLOCK = 4  # Во сколько раз уменьшается число точек на каждом следующем уровне пирамиды детализации
+LOD_OUTSIDE_POINTS = 64  # Грубое представление кривой вне видимого диапазона: для автомасштаба и панорамирования
+TRANSFORM_CACHE_SIZE_LIMIT = 512 * 1024 ** 2  # Сколько байт значений в выбранных единицах держать в кэше
+# Статистика столбца: минимум, максимум, T максимума, первая и последняя T с ненулевым значением, интеграл по T
+COLUMN_STATS = ('min', 'max', 'peak_x', 'first_x', 'last_x', 'integral')
+# Поля GraphData, которые хранятся в заголовке проекта
+PROJECT_FIELDS = (
+    'file_path', 'file_name', 'show', 'scalable', 'graphics_visible',
+    'scale_x_min', 'scale_x_max', 'scale_y_min', 'scale_y_max', 'unit_initial', 'unit_final'
+)
+
+
+class _TrackedField:
+    """
+    Поле GraphData, которое хранится в проекте. Запись в него отмечает поле измененным
+    для журнала проекта; само значение лежит в слоте с подчеркиванием.
+    """
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, graph_data, owner=None):
+        if graph_data is None:
+            return self
+        return getattr(graph_data, self.slot)
+
+    def __set__(self, graph_data, value):
+        setattr(graph_data, self.slot, value)
+        graph_data.mark_dirty(self.name)
+
+
+def _exp(values):
+    np.exp(values, out=values)
+
+
+def _exp10(values):
+    np.power(10.0, values, out=values)
+
+
+def _ln(values):
+    _log(values, np.log)
+
+
+def _lg(values):
+    _log(values, np.log10)
+
+
+def _log(values, log):
+    """Логарифм на месте; у неположительных значений его нет, они становятся NaN и не рисуются"""
+    positive = values > 0
+    log(values, out=values, where=positive)
+    values[~positive] = np.nan
+
+
+class UnitTransform:
+    """
+    Преобразование значений y - цепочка шагов, каждый из которых меняет массив на месте,
+    поэтому на всю цепочку создается одна копия данных. Шаги должны быть монотонными:
+    тогда экстремумы пирамиды детализации и диапазона значений остаются экстремумами.
+    """
+    def __init__(self, steps=(), key=None):
+        self.steps = tuple(steps)
+        self.key = key if key is not None else self.steps  # Ключ кэша преобразованных значений
+
+    def __bool__(self):
+        return bool(self.steps)
+
+    def __call__(self, values):
+        if not self.steps:
+            return values
+        result = np.array(values, dtype=np.float64)
+        for step in self.steps:
+            step(result)
+        return result
+
+    def then(self, other):
+        """Композиция: сначала это преобразование, затем other"""
+        return UnitTransform(self.steps + other.steps, (self.key, other.key))
+
+
+# Единица -> (преобразование из единицы в y, преобразование из y в единицу)
+UNIT_STEPS = {
+    'y': (UnitTransform(), UnitTransform()),
+    'ln(y)': (UnitTransform([_exp]), UnitTransform([_ln])),
+    'lg(y)': (UnitTransform([_exp10]), UnitTransform([_lg])),
+}
+_unit_transforms = {}
+
+
+def register_unit(name, to_y, from_y):
+    """Добавляет единицу: функции to_y и from_y меняют массив float64 на месте и должны быть монотонными"""
+    UNIT_STEPS[name] = (UnitTransform([to_y]), UnitTransform([from_y]))
+    UNITS.append(name)
+
+
+def unit_transform(unit_initial, unit_final):
+    """
+    Преобразование для пары единиц графика (номера в UNITS): значения переводятся из единицы
+    unit_final в y, затем из y в единицу unit_initial.
+    """
+    key = (unit_initial, unit_final)
+    if key not in _unit_transforms:
+        to_y = UNIT_STEPS[UNITS[unit_final]][0]
+        from_y = UNIT_STEPS[UNITS[unit_initial]][1]
+        transform = to_y.then(from_y)
+        _unit_transforms[key] = UnitTransform(transform.steps, key)
+    return _unit_transforms[key]
+
+
+class GraphData:
+    """
+    Класс для хранения данных о каждом графике.
+    Значения T хранятся отсортированным массивом x. Столбцы хранятся разреженно: фаза обычно
+    существует лишь в части диапазона T, поэтому для каждого столбца есть битовая маска
+    присутствия (presence), список непрерывных участков строк, где значения есть (runs),
+    и только сами эти значения (values), столбец за столбцом.
+    """
+    # Массивы данных, которые пишутся в проект и выгружаются менеджером памяти
+    DATA_ARRAYS = ('x', 'values', 'value_offsets', 'runs', 'run_offsets', 'presence', 'stats')
+
+    # values и value_offsets - свойства: при дописывании строк (append_rows) они собираются из буферов _growth
+    __slots__ = (
+        'graph_id', 'dirty_fields', 'columns', 'index_name', 'lod',
+        'x', '_values', '_value_offsets', 'runs', 'run_offsets', 'presence', 'stats', '_growth',
+    ) + tuple('_' + field for field in PROJECT_FIELDS)
+
+    file_path = _TrackedField()  # Путь к файлу
+    file_name = _TrackedField()  # Название файла без расширения
+    show = _TrackedField()  # Показывать ли график
+    scalable = _TrackedField()  # Возможность масштабирования
+    graphics_visible = _TrackedField()  # Какие из графиков будут показываться
+    scale_x_min = _TrackedField()
+    scale_x_max = _TrackedField()
+    scale_y_min = _TrackedField()
+    scale_y_max = _TrackedField()
+    unit_initial = _TrackedField()
+    unit_final = _TrackedField()
+
+    on_change = None  # Вызывается при изменении сохраняемых данных любого графика (проект не сохранен)
+
+    def __init__(self, data: 'pd.DataFrame', file_path: str, show: bool = True, scalable: bool = True):
+        self._init_fields(file_path, show, scalable)
+        self.set_data(data.index.to_numpy(dtype=np.float64), data.to_numpy(dtype=np.float64).T,
+                      data.columns, data.index.name)
+
+    @classmethod
+    def from_arrays(cls, arrays, columns, file_path, index_name=None):
+        """
+        График из готовых массивов (например, отображенных в память из файла проекта).
+        Проекты v2 хранят плотный блок: массивы 'index' и 'values' формы (столбцы, строки).
+        """
+        graph_data = cls.__new__(cls)
+        graph_data._init_fields(file_path)
+        if 'index' in arrays:
+            graph_data.set_data(arrays['index'], arrays['values'], columns, index_name)
+        else:
+            graph_data.set_arrays(arrays, columns, index_name)
+        return graph_data
+
+    def _init_fields(self, file_path, show=True, scalable=True):
+        self.dirty_fields = set()  # Поля, измененные после последнего сохранения (для журнала проекта)
+        self.graph_id = uuid.uuid4().hex  # Постоянный идентификатор графика в проекте
+        self.file_path = file_path
+        self.file_name = file_path.split("/")[-1].split(".")[0]
+        self.show = show
+        self.scalable = scalable
+        self.graphics_visible = []
+        self.scale_x_min = 273
+        self.scale_x_max = 2000
+        self.scale_y_min = 0
+        self.scale_y_max = 0
+        self.unit_initial = 0
+        self.unit_final = 0
+
+    def set_data(self, x, y, columns, index_name=None):
+        """
+        Заменить данные графика плотным блоком y формы (столбцы, строки), где NaN - отсутствующее
+        значение. Строки упорядочиваются по x (устойчивой сортировкой, чтобы строки с одинаковым T
+        сохранили порядок файла), значения хранятся в float64 или float32.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y)
+        if y.dtype != np.float32:
+            y = y.astype(np.float64, copy=False)
+        y = y.reshape(len(columns), len(x))
+        if len(x) > 1 and np.any(x[1:] < x[:-1]):
+            order = np.argsort(x, kind='stable')
+            x = x[order]
+            y = y[:, order]
+        self.set_arrays(_sparse_arrays(x, y), columns, index_name)
+
+    def append_rows(self, x, y):
+        """
+        Дописать строки в конец графика: x - значения T, y - блок формы (столбцы, строки) с NaN
+        на месте отсутствующих значений. Если новые T не меньше последней, значения дописываются
+        в буферы с запасом места (_AppendBuffers), статистика столбцов и построенные пирамиды
+        детализации дополняются только по новым строкам, поэтому цена дописывания не растет с длиной
+        графика. Иначе график перестраивается целиком через set_data.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).reshape(len(self.columns), len(x))
+        if len(x) == 0:
+            return
+        count = len(self.x)
+        if np.any(x[1:] < x[:-1]) or (count and x[0] < self.x[-1]):
+            dense = np.full((len(self.columns), count), np.nan)
+            for i in range(len(self.columns)):
+                dense[i, self.present(i)] = self.column_values(i)
+            self.set_data(np.concatenate((self.x, x)), np.concatenate((dense, y), axis=1), self.columns, self.index_name)
+            return
+
+        if self._growth is None:
+            self._growth = _AppendBuffers(self)
+        growth = self._growth
+        old_counts = growth.counts.copy()
+        tail = _sparse_arrays(x, y)
+        tail_stats = column_stats(tail)
+        new_counts = np.diff(tail['value_offsets'])
+        # Столбцы, у которых последний участок продолжается в новых строках
+        if count:
+            last = self.presence[:, (count - 1) // 8] >> (7 - (count - 1) % 8) & 1
+        else:
+            last = np.zeros(len(self.columns), dtype=np.uint8)
+        continued = np.flatnonzero(last.astype(bool) & ~np.isnan(y[:, 0]))
+
+        runs = self.runs.copy()
+        tail_runs = tail['runs'] + count
+        first_runs = tail['run_offsets'][continued]
+        runs[self.run_offsets[continued + 1] - 1, 1] = tail_runs[first_runs, 1]
+        keep = np.ones(len(tail_runs), dtype=bool)
+        keep[first_runs] = False
+        new_runs = np.diff(tail['run_offsets']) - np.isin(np.arange(len(self.columns)), continued)
+
+        stats = self.stats.copy()
+        # Трапеции между последним старым и первым новым значением продолжающихся участков
+        if count:
+            previous = np.array([growth.columns[i][old_counts[i] - 1] for i in continued], dtype=np.float64)
+            stats[continued, 5] += (x[0] - self.x[-1]) * (previous + y[continued, 0]) / 2
+        stats[:, 5] = np.where(np.isnan(stats[:, 5]), tail_stats[:, 5], stats[:, 5] + np.nan_to_num(tail_stats[:, 5]))
+        stats[:, 0] = np.fmin(stats[:, 0], tail_stats[:, 0])
+        higher = tail_stats[:, 1] > stats[:, 1]
+        higher |= np.isnan(stats[:, 1]) & ~np.isnan(tail_stats[:, 1])
+        stats[higher, 1] = tail_stats[higher, 1]
+        stats[higher, 2] = tail_stats[higher, 2]
+        stats[:, 3] = np.where(np.isnan(stats[:, 3]), tail_stats[:, 3], stats[:, 3])
+        stats[:, 4] = np.where(np.isnan(tail_stats[:, 4]), stats[:, 4], tail_stats[:, 4])
+
+        growth.append(x, ~np.isnan(y), tail)
+        self.x = growth.x[:growth.rows]
+        self.presence = growth.presence[:, :-(-growth.rows // 8)]
+        self._values = self._value_offsets = None  # Соберутся из буферов при обращении
+        self.runs = np.insert(runs, np.repeat(self.run_offsets[1:], new_runs), tail_runs[keep], axis=0)
+        self.run_offsets = self.run_offsets + np.concatenate(([0], np.cumsum(new_runs)))
+        self.stats = stats
+
+        for key in list(self.lod):
+            column = key[0] if isinstance(key, tuple) else key
+            if not new_counts[column]:
+                continue
+            if isinstance(key, tuple):
+                del self.lod[key]  # Пирамиды значений в других единицах строятся заново при обращении
+            else:
+                self.lod[key].extend(self.column_values(key), int(old_counts[key]))
+        TRANSFORM_CACHE.invalidate(self.graph_id, set(np.flatnonzero(new_counts).tolist()))
+        self.mark_dirty('data')
+
+    def set_arrays(self, arrays, columns, index_name=None):
+        """
+        Заменить данные графика готовыми разреженными массивами (см. DATA_ARRAYS).
+        Статистика столбцов считается здесь, если ее нет среди arrays (новые данные, старые проекты).
+        """
+        if 'stats' not in arrays:
+            arrays = dict(arrays, stats=column_stats(arrays))
+        self.swap_data(arrays)
+        self.lod = {}  # Номер столбца -> MinMaxPyramid, строится при первом отображении столбца
+        TRANSFORM_CACHE.invalidate(self.graph_id)
+        self.columns = tuple(str(col) for col in columns)
+        self.index_name = index_name
+        self.mark_dirty('data')
+
+    def data_arrays(self):
+        return {name: getattr(self, name) for name in self.DATA_ARRAYS}
+
+    def swap_data(self, arrays):
+        """Заменить хранилище данных (RAM или файл на диске) теми же значениями, не отмечая изменение"""
+        self._growth = None
+        for name in self.DATA_ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def set_dtype(self, dtype):
+        """Перевести значения в float32 (вдвое меньше памяти) или обратно в float64"""
+        if self._growth is not None:
+            if self._growth.dtype == dtype:
+                return
+            self.swap_data(self.data_arrays())  # Буферы дописывания собираются в обычные массивы
+        if self.values.dtype != dtype:
+            self.values = self.values.astype(dtype)
+            TRANSFORM_CACHE.invalidate(self.graph_id)
+            self.mark_dirty('data')
+
+    def stat(self, name):
+        """Значения статистики name (см. COLUMN_STATS) для всех столбцов"""
+        return self.stats[:, COLUMN_STATS.index(name)]
+
+    def top_columns(self, count, name='max'):
+        """Номера не более count столбцов с наибольшим значением статистики name, по убыванию"""
+        values = self.stat(name)
+        order = np.argsort(-values, kind='stable')  # NaN (пустые столбцы) попадают в конец
+        return [int(i) for i in order[:count] if not np.isnan(values[i])]
+
+    def column_values(self, i):
+        """Значения столбца i без отсутствующих"""
+        if self._growth is not None:
+            return self._growth.columns[i][:self._growth.counts[i]]
+        return self.values[self.value_offsets[i]:self.value_offsets[i + 1]]
+
+    @property
+    def values(self):
+        """Значения всех столбцов подряд, столбец за столбцом"""
+        if self._values is None:
+            self._values, self._value_offsets = self._growth.compact()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+
+    @property
+    def value_offsets(self):
+        """Начало значений каждого столбца в values и конец последнего"""
+        if self._value_offsets is None:
+            self._value_offsets = np.concatenate(([0], np.cumsum(self._growth.counts)))
+        return self._value_offsets
+
+    @value_offsets.setter
+    def value_offsets(self, value_offsets):
+        self._value_offsets = value_offsets
+
+    @property
+    def growing(self):
+        """В график дописываются строки: значения лежат в буферах столбцов (см. append_rows)"""
+        return self._growth is not None
+
+    @property
+    def nbytes(self):
+        if self._growth is None:
+            return sum(getattr(self, name).nbytes for name in self.DATA_ARRAYS)
+        arrays = (self.runs, self.run_offsets, self.stats, self._values, self._value_offsets)
+        return self._growth.nbytes + sum(array.nbytes for array in arrays if array is not None)
+
+    def present(self, i):
+        """Булева маска строк, в которых у столбца i есть значение"""
+        return np.unpackbits(self.presence[i], count=len(self.x)).view(bool)
+
+    def column(self, i):
+        """
+        Точки столбца i: (x, y, connect) для plot. Отсутствующие значения пропущены,
+        а connect разрывает линию между участками, где фаза существует.
+        """
+        y = self.column_values(i)
+        runs = self.runs[self.run_offsets[i]:self.run_offsets[i + 1]]
+        if len(runs) <= 1:
+            start, stop = runs[0] if len(runs) else (0, 0)
+            return self.x[start:stop], y, 'all'
+        connect = np.ones(len(y), dtype=bool)
+        connect[np.cumsum(runs[:, 1] - runs[:, 0]) - 1] = False  # Последняя точка каждого участка
+        return self.x[self.present(i)], y, connect
+
+    def column_view(self, i, x_min, x_max, points, transform=None):
+        """
+        Точки столбца i для отображения диапазона [x_min, x_max] примерно points точками:
+        (x, y, connect). Если в диапазоне точек больше, они прореживаются пирамидой минимумов
+        и максимумов. Вне диапазона кривая представлена грубо, но с верными границами.
+        transform - преобразование единиц (UnitTransform); точки, где его результат не определен, пропускаются.
+        """
+        runs, starts, ends, total = self._column_runs(i)
+        values = self.column_values(i)
+        if total == 0:
+            return self.x[:0], values, 'all'
+        pyramid = self.pyramid(i)
+
+        # Точки в окне и по одной за его краями, чтобы линия доходила до границ
+        start = max(self._point_at(runs, starts, total, np.searchsorted(self.x, x_min, side='left')) - 1, 0)
+        stop = min(self._point_at(runs, starts, total, np.searchsorted(self.x, x_max, side='right')) + 1, total)
+        points_index = np.unique(np.concatenate((
+            [0, total - 1],
+            pyramid.select(values, 0, start, LOD_OUTSIDE_POINTS),
+            pyramid.select(values, start, stop, points),
+            pyramid.select(values, stop, total, LOD_OUTSIDE_POINTS),
+        )))
+
+        run = np.searchsorted(ends, points_index, side='right')  # Участок каждой выбранной точки
+        connect = np.append(run[1:] == run[:-1], False)
+        if transform:
+            values = TRANSFORM_CACHE.get(self, i, transform)
+            # Точки без значения в новых единицах убираются, и линия на их месте разрывается
+            keep = np.flatnonzero(np.isfinite(values[points_index]))
+            connect = connect[keep] & np.append(np.diff(keep) == 1, False)
+            points_index, run = points_index[keep], run[keep]
+        x = self.x[runs[run, 0] + points_index - starts[run]]
+        y = values[points_index]
+        return x, y, connect
+
+    def pyramid(self, i):
+        """Пирамида минимумов и максимумов столбца i, строится при первом обращении"""
+        if i not in self.lod:
+            self.lod[i] = MinMaxPyramid(self.column_values(i))
+        return self.lod[i]
+
+    def _column_runs(self, i):
+        """Участки столбца i: (runs, номер первой точки участка, номер точки после участка, число точек)"""
+        runs = self.runs[self.run_offsets[i]:self.run_offsets[i + 1]]
+        lengths = runs[:, 1] - runs[:, 0]
+        ends = np.cumsum(lengths)
+        total = int(ends[-1]) if len(ends) else 0
+        return runs, ends - lengths, ends, total
+
+    @staticmethod
+    def _point_at(runs, starts, total, row):
+        """Номер первой точки столбца в строке row или дальше"""
+        run = np.searchsorted(runs[:, 1], row, side='right')
+        if run == len(runs):
+            return total
+        return int(starts[run] + max(0, row - runs[run, 0]))
+
+    def bounds(self):
+        """(x_min, x_max, y_min, y_max) по всем данным или None, если значений нет"""
+        if np.all(np.isnan(self.stat('min'))):
+            return None
+        return float(self.x[0]), float(self.x[-1]), float(np.nanmin(self.stat('min'))), float(np.nanmax(self.stat('max')))
+
+    def y_range(self, x_min, x_max, columns=None, transform=None):
+        """
+        (min, max) значений столбцов columns (по умолчанию всех) в единицах transform
+        при x_min <= T <= x_max или None, если значений нет.
+        """
+        start = np.searchsorted(self.x, x_min, side='left')
+        stop = np.searchsorted(self.x, x_max, side='right')
+        low, high = np.inf, -np.inf
+        for i in range(len(self.columns)) if columns is None else columns:
+            extrema = self.column_range(i, start, stop, transform)
+            if extrema is not None:
+                low, high = min(low, extrema[0]), max(high, extrema[1])
+        if low > high:
+            return None
+        return float(low), float(high)
+
+    def visible_y_range(self, x_min, x_max):
+        """Диапазон значений видимых столбцов (graphics_visible) в выбранных единицах"""
+        columns = [i for i, visible in enumerate(self.graphics_visible) if visible]
+        return self.y_range(x_min, x_max, columns, self.unit_transform)
+
+    def column_range(self, i, start_row, stop_row, transform=None):
+        """
+        (min, max) столбца i в строках [start_row, stop_row) в единицах transform или None.
+        Экстремумы ищутся по пирамиде за O(log n). Преобразования монотонны, поэтому экстремумы
+        переходят в экстремумы; если минимум вне области определения преобразования (логарифм
+        неположительного значения), он ищется по пирамиде преобразованных значений.
+        Если пирамида столбца не построена (график скрыт или выгружен), строки просматриваются
+        напрямую: пирамида и преобразованные значения не создаются и не занимают RAM.
+        """
+        runs, starts, _, total = self._column_runs(i)
+        start = self._point_at(runs, starts, total, start_row)
+        stop = self._point_at(runs, starts, total, stop_row)
+        if start >= stop:
+            return None
+        values = self.column_values(i)
+        scan = i not in self.lod
+        if scan:
+            minimum = start + int(np.argmin(values[start:stop]))
+            maximum = start + int(np.argmax(values[start:stop]))
+        else:
+            minimum, maximum = self.pyramid(i).extrema(values, start, stop)
+        if not transform:
+            return values[minimum], values[maximum]
+        low, high = transform(values[[minimum, maximum]])
+        if np.isnan(high):
+            return None  # Ни одно значение в диапазоне не переводится в эти единицы
+        if np.isnan(low) and scan:
+            low = np.nanmin(transform(values[start:stop]))
+        elif np.isnan(low):
+            key = (i, transform.key)
+            if key not in self.lod:
+                transformed = TRANSFORM_CACHE.get(self, i, transform)
+                defined = np.where(np.isnan(transformed), np.inf, transformed)
+                self.lod[key] = MinMaxPyramid(defined), defined
+            pyramid, defined = self.lod[key]
+            low = defined[pyramid.extrema(defined, start, stop)[0]]
+        return low, high
+
+    def mark_dirty(self, name):
+        """Отметить поле измененным. Вызывается явно при изменении списков на месте"""
+        if GraphData.on_change is not None:
+            GraphData.on_change()
+        self.dirty_fields.add(name)
+
+    @property
+    def units_list(self):
+        return UNITS
+
+    @property
+    def unit_transform(self):
+        return unit_transform(self.unit_initial, self.unit_final)
+
+    def __getstate__(self):
+        """Определяет, какие данные будут сериализованы."""
+        state = {field: getattr(self, field) for field in PROJECT_FIELDS}
+        state.update(self.data_arrays())
+        state.update(graph_id=self.graph_id, dirty_fields=self.dirty_fields,
+                     columns=self.columns, index_name=self.index_name)
+        return state
+
+    def __setstate__(self, state):
+        """Определяет, как объект восстанавливается из сериализованных данных."""
+        self.dirty_fields = set()
+        # Проекты старых версий: DataFrame в __dict__, без идентификатора и журнала изменений
+        self.graph_id = state.get('graph_id') or uuid.uuid4().hex
+        if 'data' in state:
+            data = state['data']
+            self.set_data(data.index.to_numpy(dtype=np.float64), data.to_numpy(dtype=np.float64).T,
+                          data.columns, data.index.name)
+            state = dict(state)
+            state.setdefault('dirty_fields', set(PROJECT_FIELDS) | {'data'})
+        else:
+            self.set_arrays(state, state['columns'], state['index_name'])
+        for field in PROJECT_FIELDS:
+            setattr(self, '_' + field, state[field])
+        self.dirty_fields = state['dirty_fields']
+
+    # def __repr__(self):
+    #     return f"GraphData({self.file_name}, show={self.show}, scalable={self.scalable})"
+
+    # Ссылки на эти методы сохранены в проектах старых версий (pickle), без них такие проекты не откроются
+    def u_1_1(self, y):
+        return y
+
+    def u_1_2(self, y):
+        return unit_transform(1, 0)(y)
+
+    def u_1_3(self, y):
+        return unit_transform(2, 0)(y)
+
+    def u_2_1(self, y):
+        return unit_transform(0, 1)(y)
+
+    def u_3_1(self, y):
+        return unit_transform(0, 2)(y)
+
+
+def _sparse_arrays(x, y):
+    """Разреженные массивы графика (см. GraphData.DATA_ARRAYS, без статистики) по плотному блоку y формы (столбцы, строки)"""
+    present = ~np.isnan(y)
+    # +1 там, где начинается участок со значениями, -1 сразу после его конца
+    edges = np.diff(present.astype(np.int8), axis=1, prepend=0, append=0)
+    run_columns, starts = np.nonzero(edges == 1)
+    stops = np.nonzero(edges == -1)[1]
+    return {
+        'x': np.ascontiguousarray(x),
+        'values': y[present],  # Порядок строк блока: столбец за столбцом
+        'value_offsets': np.concatenate(([0], np.cumsum(present.sum(axis=1)))),
+        'runs': np.column_stack((starts, stops)),
+        'run_offsets': np.searchsorted(run_columns, np.arange(len(y) + 1)),
+        'presence': np.packbits(present, axis=1),
+    }
+
+
+def _write_into(buffer, start, values):
+    """
+    Записывает values в buffer (по последней оси) начиная с start и возвращает буфер. Если места
+    не хватает, берется новый буфер вдвое больше и в него копируются первые start элементов:
+    при дописывании в конец каждый элемент копируется в среднем O(1) раз.
+    """
+    if values.shape[-1] == 0:
+        return buffer
+    end = start + values.shape[-1]
+    if end > buffer.shape[-1]:
+        grown = np.empty(buffer.shape[:-1] + (max(2 * buffer.shape[-1], end),), dtype=buffer.dtype)
+        grown[..., :start] = buffer[..., :start]
+        buffer = grown
+    buffer[..., start:end] = values
+    return buffer
+
+
+class _AppendBuffers:
+    """
+    Данные графика, в который дописываются строки: x, маска присутствия и значения каждого столбца
+    лежат в отдельных буферах с запасом места. Заполненная часть буферов не меняется (кроме
+    незанятых битов последнего байта маски), поэтому взятые из них срезы остаются верными.
+    """
+    __slots__ = ('x', 'presence', 'columns', 'counts', 'rows', 'dtype')
+
+    def __init__(self, graph_data):
+        self.dtype = graph_data.values.dtype
+        self.rows = len(graph_data.x)
+        self.x = graph_data.x  # Заполнен целиком: первое дописывание перенесет его в новый буфер
+        self.presence = np.array(graph_data.presence)  # Последний байт маски дополняется на месте
+        self.counts = np.diff(graph_data.value_offsets)
+        self.columns = [graph_data.column_values(i) for i in range(len(self.counts))]
+
+    def append(self, x, present, tail):
+        """Дописывает строки: x, маску present формы (столбцы, строки) и значения tail (см. _sparse_arrays)"""
+        used = self.rows % 8
+        if used:
+            head = np.unpackbits(self.presence[:, self.rows // 8:self.rows // 8 + 1], axis=1)[:, :used]
+            present = np.concatenate((head.astype(bool), present), axis=1)
+        self.presence = _write_into(self.presence, self.rows // 8, np.packbits(present, axis=1))
+        self.x = _write_into(self.x, self.rows, x)
+        self.rows += len(x)
+        offsets = tail['value_offsets']
+        for i in np.flatnonzero(np.diff(offsets)):
+            new = tail['values'][offsets[i]:offsets[i + 1]].astype(self.dtype, copy=False)
+            self.columns[i] = _write_into(self.columns[i], self.counts[i], new)
+            self.counts[i] += len(new)
+
+    def compact(self):
+        """(values, value_offsets) - значения всех столбцов подряд, как в обычном хранилище"""
+        offsets = np.concatenate(([0], np.cumsum(self.counts)))
+        values = np.empty(offsets[-1], dtype=self.dtype)
+        for i, column in enumerate(self.columns):
+            values[offsets[i]:offsets[i + 1]] = column[:self.counts[i]]
+        return values, offsets
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.presence.nbytes + sum(column.nbytes for column in self.columns)
+
+
+def column_stats(arrays):
+    """
+    Статистика всех столбцов (см. COLUMN_STATS) по разреженным массивам графика: массив
+    (столбцы, len(COLUMN_STATS)), у пустых столбцов - NaN. Интеграл считается методом трапеций
+    только внутри участков, где значения есть. Все столбцы обрабатываются одним проходом numpy.
+    """
+    x, values, offsets = arrays['x'], arrays['values'], arrays['value_offsets']
+    runs = arrays['runs']  # Участки всех столбцов по порядку, как и values
+    count = len(offsets) - 1
+    stats = np.full((count, len(COLUMN_STATS)), np.nan)
+    if values.size == 0:
+        return stats
+    lengths = runs[:, 1] - runs[:, 0]
+    run_of_value = np.repeat(np.arange(len(runs)), lengths)
+    value_x = x[np.arange(len(values)) + np.repeat(runs[:, 0] - (np.cumsum(lengths) - lengths), lengths)]
+    column_of_value = np.repeat(np.arange(count), np.diff(offsets))
+    filled = np.flatnonzero(np.diff(offsets) > 0)
+    stats[filled, 0] = np.minimum.reduceat(values, offsets[filled])
+    stats[filled, 1] = np.maximum.reduceat(values, offsets[filled])
+    # Первое значение, равное максимуму своего столбца
+    peaks = np.flatnonzero(values == stats[column_of_value, 1])
+    columns, first = np.unique(column_of_value[peaks], return_index=True)
+    stats[columns, 2] = value_x[peaks[first]]
+    nonzero = np.flatnonzero(values != 0)
+    if nonzero.size:  # Все значения нулевые: первое и последнее ненулевое остаются NaN
+        columns, first = np.unique(column_of_value[nonzero], return_index=True)
+        stats[columns, 3] = value_x[nonzero[first]]
+        last = np.diff(column_of_value[nonzero], append=-1) != 0  # Последнее ненулевое значение каждого столбца
+        stats[column_of_value[nonzero][last], 4] = value_x[nonzero][last]
+    # Трапеции между соседними значениями одного участка
+    inside = run_of_value[1:] == run_of_value[:-1]
+    areas = np.diff(value_x) * (values[1:] + values[:-1].astype(np.float64)) / 2
+    stats[filled, 5] = np.bincount(column_of_value[1:][inside], weights=areas[inside], minlength=count)[filled]
+    return stats
+
+
+class MinMaxPyramid:
+    """
+    Пирамида минимумов и максимумов одного столбца для прореживания кривой.
+    Уровень k делит точки столбца на блоки по LOD_BLOCK ** k точек и хранит номера точек с
+    минимумом и максимумом каждого блока. Из каждого блока на экран попадают обе точки, поэтому
+    пики и вертикальные ступеньки (несколько значений при одном T) не теряются. Преобразования
+    единиц монотонны, так что выбранные точки остаются экстремумами и после них.
+    """
+    def __init__(self, values):
+        self.levels = []  # (номера минимумов, номера максимумов) уровней 1, 2, ...
+        index_type = np.int32 if len(values) < 2 ** 31 else np.int64  # Пирамида занимает ~треть объема values
+        minimums = maximums = np.arange(len(values), dtype=index_type)
+        while len(minimums) > 1:
+            minimums = self._reduce(values, minimums, np.argmin)
+            maximums = self._reduce(values, maximums, np.argmax)
+            self.levels.append((minimums, maximums))
+        self.buffers = list(self.levels)  # Массивы уровней с запасом места для extend, levels - их начало
+
+    def extend(self, values, count):
+        """
+        Дополняет пирамиду после того, как в конец values дописаны точки (раньше их было count).
+        На каждом уровне пересчитываются только блоки, куда попали новые точки, и они записываются
+        в буферы уровней на место прежних.
+        """
+        minimums = maximums = np.arange(count - count % LOD_BLOCK, len(values))
+        level = 0
+        while True:
+            first = count // LOD_BLOCK ** (level + 1)  # Первый блок уровня, который меняется
+            minimums = self._reduce(values, minimums, np.argmin)
+            maximums = self._reduce(values, maximums, np.argmax)
+            if level < len(self.levels):
+                size = first + len(minimums)
+                minimum_buffer, maximum_buffer = self.buffers[level]
+                minimum_buffer = _write_into(minimum_buffer, first, minimums.astype(minimum_buffer.dtype))
+                maximum_buffer = _write_into(maximum_buffer, first, maximums.astype(maximum_buffer.dtype))
+                self.buffers[level] = (minimum_buffer, maximum_buffer)
+                minimums, maximums = minimum_buffer[:size], maximum_buffer[:size]
+                self.levels[level] = (minimums, maximums)
+            else:
+                self.levels.append((minimums, maximums))
+                self.buffers.append((minimums, maximums))
+            if len(minimums) <= 1:
+                break
+            # Кандидаты следующего уровня: блоки этого уровня, начиная с первого измененного блока уровня выше
+            start = first - first % LOD_BLOCK
+            minimums, maximums = minimums[start:], maximums[start:]
+            level += 1
+        del self.levels[level + 1:]
+        del self.buffers[level + 1:]
+
+    @staticmethod
+    def _reduce(values, candidates, pick, group=LOD_BLOCK):
+        """Выбирает экстремум в каждой группе из group соседних кандидатов"""
+        padding = -len(candidates) % group
+        if padding:
+            candidates = np.concatenate((candidates, np.repeat(candidates[-1:], padding)))
+        candidates = candidates.reshape(-1, group)
+        return candidates[np.arange(len(candidates)), pick(values[candidates], axis=1)]
+
+    def extrema(self, values, start, stop):
+        """
+        Номера точек с минимумом и максимумом среди [start, stop). Диапазон покрывается блоками
+        пирамиды: на каждом уровне берутся только неполные блоки по краям, не больше 2 * (LOD_BLOCK - 1).
+        """
+        minimums, maximums = [], []
+        level = 0
+        while start < stop:
+            head = min(-(-start // LOD_BLOCK) * LOD_BLOCK, stop)  # Края диапазона, выровненные на блоки уровня выше
+            tail = max(stop // LOD_BLOCK * LOD_BLOCK, head)
+            if level == len(self.levels) or head == tail:
+                head = tail = stop  # Остаток диапазона целиком на этом уровне
+            for first, last in ((start, head), (tail, stop)):
+                if level == 0:
+                    minimums.append(np.arange(first, last))
+                    maximums.append(minimums[-1])
+                else:
+                    minimums.append(self.levels[level - 1][0][first:last])
+                    maximums.append(self.levels[level - 1][1][first:last])
+            start, stop = head // LOD_BLOCK, tail // LOD_BLOCK
+            level += 1
+        minimums, maximums = np.concatenate(minimums), np.concatenate(maximums)
+        return int(minimums[np.argmin(values[minimums])]), int(maximums[np.argmax(values[maximums])])
+
+    def select(self, values, start, stop, points):
+        """
+        Возрастающие номера примерно points точек, представляющих точки [start, stop) столбца values.
+        Берется самый подробный уровень, где блоков не больше LOD_BLOCK на каждую пару точек,
+        и его соседние блоки объединяются до нужного числа.
+        """
+        count = stop - start
+        if count <= points:
+            return np.arange(start, max(stop, start), dtype=np.int64)
+        blocks = max(points // 2, 1)
+        level, size = 0, 1
+        while count > size * LOD_BLOCK * blocks and level < len(self.levels):
+            level += 1
+            size *= LOD_BLOCK
+        if level == 0:
+            minimums = maximums = np.arange(start, stop, dtype=np.int64)
+        else:
+            minimums, maximums = self.levels[level - 1]
+            first, last = start // size, min(-(-stop // size), len(minimums))
+            minimums, maximums = minimums[first:last], maximums[first:last]
+        group = -(-len(minimums) // blocks)
+        if group > 1:
+            minimums = self._reduce(values, minimums, np.argmin, group)
+            maximums = self._reduce(values, maximums, np.argmax, group)
+        return np.column_stack((np.minimum(minimums, maximums), np.maximum(minimums, maximums))).ravel()
+
+
+class TransformCache:
+    """
+    Значения столбцов в выбранных единицах по ключу (graph_id, столбец, преобразование).
+    Повторное переключение единиц не пересчитывает логарифмы и экспоненты по всему столбцу.
+    При превышении лимита размера вытесняются давно не использованные записи;
+    при изменении данных графика удаляются его записи или записи измененных столбцов (invalidate).
+    """
+    def __init__(self, size_limit=TRANSFORM_CACHE_SIZE_LIMIT):
+        self.size_limit = size_limit
+        self.entries = OrderedDict()  # Ключ -> массив, от давно использованных к недавним
+        self.size = 0
+
+    def get(self, graph_data, i, transform):
+        if not transform:
+            return graph_data.column_values(i)
+        key = (graph_data.graph_id, i, transform.key)
+        values = self.entries.get(key)
+        if values is not None:
+            self.entries.move_to_end(key)
+            return values
+        values = transform(graph_data.column_values(i))
+        self.entries[key] = values
+        self.size += values.nbytes
+        while self.size > self.size_limit and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+        return values
+
+    def invalidate(self, graph_id, columns=None):
+        """Удаляет записи графика graph_id, а если задано множество columns - только записи этих столбцов"""
+        for key in [key for key in self.entries if key[0] == graph_id and (columns is None or key[1] in columns)]:
+            self.size -= self.entries.pop(key).nbytes
+
+
+TRANSFORM_CACHE = TransformCache()
+
+
+class SpeciesIndex:
+    """
+    Обратный индекс соединений: имя -> столбцы графиков проекта, где оно есть.
+    Запрос - точное имя, префикс (SiO2*) или шаблон с *, ? и [] (*SO4*). Префикс ищется двоичным
+    поиском по отсортированным именам, шаблон проверяется один раз для каждого разного имени,
+    а не для каждого столбца каждого графика. Регистр учитывается: Co и CO - разные соединения.
+    """
+    def __init__(self):
+        self.columns = {}  # Имя -> {graph_id: [номера столбцов]}
+        self.names = None  # Отсортированные имена, строятся при первом запросе после изменений
+
+    def add(self, graph_data):
+        for i, name in enumerate(graph_data.columns):
+            self.columns.setdefault(name, {}).setdefault(graph_data.graph_id, []).append(i)
+        self.names = None
+
+    def remove(self, graph_data):
+        for name in set(graph_data.columns):
+            graphs = self.columns.get(name, {})
+            graphs.pop(graph_data.graph_id, None)
+            if not graphs:
+                self.columns.pop(name, None)
+        self.names = None
+
+    def clear(self):
+        self.columns.clear()
+        self.names = None
+
+    def find(self, query):
+        """Столбцы, подходящие под запрос: {graph_id: [номера столбцов по возрастанию]}"""
+        query = query.strip()
+        if not query:
+            return {}
+        if query.endswith('*') and not any(char in query[:-1] for char in '*?['):
+            if self.names is None:
+                self.names = sorted(self.columns)
+            prefix = query[:-1]
+            names = []
+            for name in self.names[bisect.bisect_left(self.names, prefix):]:
+                if not name.startswith(prefix):
+                    break
+                names.append(name)
+        elif any(char in query for char in '*?['):
+            names = [name for name in self.columns if fnmatch.fnmatchcase(name, query)]
+        else:
+            names = [query] if query in self.columns else []
+        matches = {}
+        for name in names:
+            for graph_id, columns in self.columns[name].items():
+                matches.setdefault(graph_id, []).extend(columns)
+        return {graph_id: sorted(columns) for graph_id, columns in matches.items()}
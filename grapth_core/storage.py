@@ -0,0 +1,656 @@
+"""
+Чтение CSV (с дисковым кэшем разобранных файлов), формат проекта .sgr с журналом изменений,
+автосохранение и выгрузка данных графиков из RAM (MemoryManager).
+Модуль не зависит от Qt.
+"""
+import os
+import io
+import json
+import mmap
+import pickle
+import copy
+import time
+import shutil
+import tempfile
+import struct
+import zlib
+import hashlib
+import uuid
+from types import SimpleNamespace
+from collections import OrderedDict
+import numpy as np
+
+from .graph import GraphData, PROJECT_FIELDS, TRANSFORM_CACHE
+
+CSV_CHUNK_SIZE = 20000  # Сколько строк CSV читается за один шаг фоновой загрузки
+# Все столбцы после "T" числовые, поэтому парсер сразу читает их как float без определения типов
+CSV_FLOAT_OPTIONS = {'dtype': np.float64, 'float_precision': 'high'}
+CSV_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".grapth_researcher", "csv_cache")  # Кэш разобранных CSV
+CSV_CACHE_SIZE_LIMIT = 2 * 1024 ** 3  # Максимальный размер кэша в байтах, 0 - кэш отключен
+CSV_CACHE_HASH_BLOCK = 64 * 1024  # Размер блока файла, который попадает в хэш содержимого
+CSV_CACHE_HASH_BLOCKS = 16  # Сколько равномерно расположенных блоков файла хэшируется
+CSV_CACHE_FORMAT = 2  # Версия записей кэша; меняется вместе с тем, как разбирается файл
+
+# Формат проекта .sgr: преамбула, выровненные блоки чисел, JSON заголовок с метаданными.
+# В версии 2 данные графика хранились плотным блоком, с версии 3 - разреженными столбцами.
+# Старые проекты (pickle списка GraphData и v2) по-прежнему открываются.
+PROJECT_MAGIC = b"SGR\x00"
+PROJECT_VERSION = 3
+PROJECT_PREAMBLE = struct.Struct("<4sIQQ")  # Сигнатура, версия, смещение и размер заголовка
+PROJECT_ALIGN = 64  # Выравнивание блоков данных в файле
+# Изменения между полными сохранениями дописываются в конец файла проекта записями журнала
+JOURNAL_MAGIC = b"JRNL"
+JOURNAL_RECORD = struct.Struct("<4sIIQ")  # Сигнатура, размер JSON, crc32 JSON, размер блока данных
+PROJECT_COMPACT_RECORDS = 200  # После стольких записей журнала проект переписывается целиком
+PROJECT_COMPACT_RATIO = 2  # Проект переписывается, если файл больше живых данных во столько раз
+PROJECT_COMPACT_SLACK = 16 * 1024 ** 2  # Запас в байтах, чтобы не переписывать маленькие проекты
+AUTOSAVE_DIR = os.path.join(os.path.expanduser("~"), ".grapth_researcher", "autosave")  # Автосохраненные копии
+MEMORY_BUDGET = 4 * 1024 ** 3  # Сколько байт данных графиков держать в RAM, остальное выгружается на диск
+
+
+class LoadCanceled(Exception):
+    """Загрузка файла отменена пользователем"""
+
+
+class CsvCache:
+    """
+    Дисковый кэш разобранных CSV файлов.
+    Запись ищется по пути, размеру и времени изменения файла, а хэш содержимого внутри записи
+    защищает от подмены файла с тем же размером и временем. Хэшируются только равномерно
+    расположенные блоки файла, чтобы проверка занимала миллисекунды и для файлов в сотни МБ.
+    Время изменения самой записи служит отметкой последнего использования: при превышении
+    лимита размера удаляются давно не использованные записи.
+    """
+    def __init__(self, directory=CSV_CACHE_DIR, size_limit=CSV_CACHE_SIZE_LIMIT):
+        self.directory = directory
+        self.size_limit = size_limit
+
+    def get(self, file_path):
+        """Вернуть (data, bounds) из кэша или None, если записи нет или она устарела"""
+        if self.size_limit <= 0:
+            return None
+        try:
+            stat = os.stat(file_path)
+            entry_path = self._entry_path(file_path, stat)
+            with open(entry_path, "rb") as file:
+                try:
+                    entry = pickle.load(file)
+                    entry_hash, data, bounds = entry['hash'], entry['data'], entry['bounds']
+                except OSError:
+                    raise
+                except Exception:
+                    # Запись повреждена или сохранена другой версией pandas/numpy (ImportError,
+                    # TypeError, ValueError и т.п.): это промах, запись удаляется
+                    entry_hash = None
+            if entry_hash is None:
+                os.remove(entry_path)
+                return None
+            if entry_hash != self._content_hash(file_path, stat.st_size):
+                return None
+            os.utime(entry_path)  # Отмечаем использование записи для вытеснения по LRU
+            return data, bounds
+        except OSError:
+            return None
+
+    def put(self, file_path, data, bounds):
+        """Сохранить разобранный файл в кэш. Ошибки записи не мешают загрузке графика"""
+        if self.size_limit <= 0:
+            return
+        try:
+            stat = os.stat(file_path)
+            entry = {'hash': self._content_hash(file_path, stat.st_size), 'data': data, 'bounds': bounds}
+            os.makedirs(self.directory, exist_ok=True)
+            entry_path = self._entry_path(file_path, stat)
+            # Уникальное имя временного файла: в кэш могут одновременно писать процессы пула
+            temp_file_path = f"{entry_path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_file_path, "wb") as temp_file:
+                    pickle.dump(entry, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_file_path, entry_path)
+            finally:
+                if os.path.exists(temp_file_path):
+                    os.remove(temp_file_path)
+            self._evict()
+        except OSError:
+            pass
+
+    def _entry_path(self, file_path, stat):
+        key = f"{CSV_CACHE_FORMAT}|{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    def _content_hash(self, file_path, size):
+        digest = hashlib.blake2b(str(size).encode("utf-8"), digest_size=16)
+        with open(file_path, "rb") as file:
+            if size <= CSV_CACHE_HASH_BLOCK * CSV_CACHE_HASH_BLOCKS:
+                digest.update(file.read())
+            else:
+                step = (size - CSV_CACHE_HASH_BLOCK) // (CSV_CACHE_HASH_BLOCKS - 1)
+                for i in range(CSV_CACHE_HASH_BLOCKS):  # Первый и последний блоки входят всегда
+                    file.seek(i * step)
+                    digest.update(file.read(CSV_CACHE_HASH_BLOCK))
+        return digest.hexdigest()
+
+    def _evict(self):
+        """Удаляет самые давно использованные записи, пока кэш больше лимита"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue  # Запись уже удалена другим процессом
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.size_limit:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total_size -= size
+
+
+CSV_CACHE = CsvCache()
+
+
+def load_csv(file_path, chunk_size=CSV_CHUNK_SIZE, on_progress=None, is_canceled=None):
+    """
+    Читает CSV файл и возвращает готовый GraphData.
+    Повторно добавляемые файлы берутся из дискового кэша без разбора текста.
+    Сначала пробуется быстрый путь, где все столбцы читаются как float; если в файле есть
+    нечисловые значения, файл перечитывается с определением типов.
+    """
+    cached = CSV_CACHE.get(file_path)
+    if cached is not None:
+        data, bounds = cached
+        if on_progress is not None:
+            on_progress(100)
+    else:
+        try:
+            data, bounds = _read_csv(file_path, chunk_size, on_progress, is_canceled, CSV_FLOAT_OPTIONS)
+        except ValueError:
+            data, bounds = _read_csv(file_path, chunk_size, on_progress, is_canceled, {})
+        CSV_CACHE.put(file_path, data, bounds)
+
+    x_min, x_max, y_min, y_max = bounds
+    graph_data = GraphData(data, file_path)
+    graph_data.graphics_visible = [True] * len(graph_data.columns)
+    # Значения по умолчанию остаются, если в файле нет строк или столбцов
+    if np.isfinite(x_min):
+        graph_data.scale_x_min = x_min  # Минимум значений индекса "T"
+        graph_data.scale_x_max = x_max  # Максимум значений индекса "T"
+    if np.isfinite(y_min):
+        graph_data.scale_y_min = y_min  # Минимум значений во всех столбцах
+        graph_data.scale_y_max = y_max  # Максимум значений во всех столбцах
+    return graph_data
+
+
+def load_csv_file(file_path):
+    """Чтение файла целиком, без прогресса - для процессов пула при загрузке нескольких файлов"""
+    return load_csv(file_path, chunk_size=None)
+
+
+def _read_csv(file_path, chunk_size, on_progress, is_canceled, read_options):
+    """
+    Читает CSV файл по частям (или целиком, если chunk_size равен None) и возвращает
+    (data, (x_min, x_max, y_min, y_max)).
+    Границы масштаба считаются по ходу чтения, поэтому повторный проход по данным не нужен.
+    on_progress(percent) вызывается после каждой части, is_canceled() проверяется перед каждой частью.
+    """
+    import pandas as pd  # Импорт pandas занимает больше времени, чем весь остальной пакет; нужен только здесь
+    total_size = max(os.path.getsize(file_path), 1)
+    chunks = []
+    x_min = y_min = np.inf
+    x_max = y_max = -np.inf
+    with open(file_path, "rb") as file:
+        if chunk_size is None:
+            reader = [pd.read_csv(file, index_col=0, **read_options)]
+        else:
+            reader = pd.read_csv(file, index_col=0, chunksize=chunk_size, **read_options)
+        for chunk in reader:
+            if is_canceled is not None and is_canceled():
+                raise LoadCanceled()
+            # Пустые ячейки остаются NaN: фазы при этой T нет, это не нулевое значение
+            if len(chunk.index) > 0:
+                x_min = min(x_min, chunk.index.min())
+                x_max = max(x_max, chunk.index.max())
+            values = chunk.to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            if values.size > 0:
+                y_min = min(y_min, values.min())
+                y_max = max(y_max, values.max())
+            chunks.append(chunk)
+            if on_progress is not None:
+                on_progress(min(100, int(file.tell() * 100 / total_size)))
+    if not chunks:
+        raise ValueError("Файл не содержит данных.")
+    data = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+    return data, (x_min, x_max, y_min, y_max)
+
+
+class CsvTail:
+    """
+    Чтение CSV, который еще дописывается (расчет продолжается). Каждый вызов read разбирает
+    только байты, появившиеся после прошлого чтения, и только целые строки: недописанная
+    последняя строка ждет следующего вызова.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.offset = 0  # Байт после последней разобранной строки
+        self.header = None  # Строка заголовка, с которой разбирается каждый новый кусок
+        self.identity = None  # (устройство, inode): если файл заменен другим, чтение начинается сначала
+
+    def read(self):
+        """
+        Новые строки: (DataFrame, restarted) или None, если целых строк не добавилось.
+        restarted - файл прочитан с начала (первое чтение, файл перезаписан или укорочен):
+        данные графика нужно заменить, а не дополнить.
+        """
+        import pandas as pd
+        with open(self.file_path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            restarted = (stat.st_dev, stat.st_ino) != self.identity or stat.st_size < self.offset
+            if restarted:
+                self.identity = (stat.st_dev, stat.st_ino)
+                self.offset = 0
+                self.header = None
+            file.seek(self.offset)
+            chunk = file.read()
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return None
+        self.offset += end
+        chunk = chunk[:end]
+        if self.header is None:
+            header_end = chunk.find(b"\n") + 1
+            self.header, chunk = chunk[:header_end], chunk[header_end:]
+        if not chunk.strip():
+            return None
+        try:
+            data = pd.read_csv(io.BytesIO(self.header + chunk), index_col=0, **CSV_FLOAT_OPTIONS)
+        except ValueError:
+            data = pd.read_csv(io.BytesIO(self.header + chunk), index_col=0)
+        return data, restarted
+
+
+def write_project(file, graphs):
+    """
+    Записывает список GraphData в открытый бинарный файл в формате .sgr v3 (PROJECT_VERSION).
+    Каждый график хранится разреженными массивами GraphData.DATA_ARRAYS (значения в float64 или
+    float32), поэтому при открытии любой столбец можно отобразить в память отдельно от остальных.
+    Файл получается без записей журнала: их дописывает в конец append_project_changes.
+    """
+    header = {'version': PROJECT_VERSION, 'graphs': []}
+    offset = PROJECT_PREAMBLE.size
+    placed = []
+    for graph_data in graphs:
+        meta = {field: _json_value(getattr(graph_data, field)) for field in PROJECT_FIELDS}
+        meta['id'] = graph_data.graph_id
+        offset = _place_data(graph_data, meta, offset, placed)
+        header['graphs'].append(meta)
+    file.write(PROJECT_PREAMBLE.pack(PROJECT_MAGIC, PROJECT_VERSION, 0, 0))
+    _write_arrays(file, placed)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    header_offset = file.tell()
+    file.write(header_bytes)
+    file.seek(0)
+    file.write(PROJECT_PREAMBLE.pack(PROJECT_MAGIC, PROJECT_VERSION, header_offset, len(header_bytes)))
+
+
+def append_project_changes(file_path, graphs, journal):
+    """
+    Дописывает в конец проекта одну запись журнала: измененные поля графиков, блоки данных
+    новых или измененных графиков и текущий порядок графиков (удаленные в нем отсутствуют).
+    Объем записи зависит только от изменений, а не от размера проекта.
+    journal - состояние журнала, которое вернул read_project; возвращает обновленное состояние,
+    в котором 'written' - расположение записанных массивов по graph_id (см. map_project_arrays).
+    """
+    order = [graph_data.graph_id for graph_data in graphs]
+    if order == journal['order'] and not any(graph_data.dirty_fields for graph_data in graphs):
+        return dict(journal, written={})  # Изменений нет
+
+    # Раскладка: заголовок записи, выровненный блок данных, JSON с метаданными
+    data_start = _align(journal['end'] + JOURNAL_RECORD.size)
+    offset = data_start
+    placed = []
+    changes = {}
+    written = {}
+    for graph_data in graphs:
+        if not graph_data.dirty_fields:
+            continue
+        meta = {
+            field: _json_value(getattr(graph_data, field))
+            for field in PROJECT_FIELDS if field in graph_data.dirty_fields
+        }
+        if 'data' in graph_data.dirty_fields:
+            offset = _place_data(graph_data, meta, offset, placed)
+            written[graph_data.graph_id] = meta['arrays']
+        changes[graph_data.graph_id] = meta
+    payload = json.dumps({'order': order, 'graphs': changes}, ensure_ascii=False).encode("utf-8")
+
+    with open(file_path, "r+b") as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() > journal['end']:
+            file.truncate(journal['end'])  # Хвост незавершенной записи после сбоя
+        file.seek(journal['end'])
+        file.write(JOURNAL_RECORD.pack(JOURNAL_MAGIC, len(payload), zlib.crc32(payload), offset - data_start))
+        _write_arrays(file, placed)
+        file.write(b"\x00" * (offset - file.tell()))
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+        end = file.tell()
+    return dict(journal, records=journal['records'] + 1, end=end, order=order, written=written)
+
+
+def map_project_arrays(file_path, written):
+    """
+    Массивы, которые append_project_changes только что дописал в проект (journal['written']),
+    отображенные в память: {graph_id: массивы}. Заголовок и журнал проекта при этом не читаются.
+    """
+    if not written:
+        return {}
+    with open(file_path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return {graph_id: _map_arrays(buffer, {'arrays': arrays}) for graph_id, arrays in written.items()}
+
+
+def project_needs_compaction(file_path, graphs, journal):
+    """Журнал слишком длинный или в файле накопилось много данных удаленных и замененных графиков"""
+    if journal['records'] >= PROJECT_COMPACT_RECORDS or journal['version'] < PROJECT_VERSION:
+        return True  # Файл старой версии переписывается целиком, чтобы не смешивать форматы
+    live_size = sum(graph_data.nbytes for graph_data in graphs)
+    return os.path.getsize(file_path) > PROJECT_COMPACT_RATIO * live_size + PROJECT_COMPACT_SLACK
+
+
+class _ProjectUnpickler(pickle.Unpickler):
+    """
+    Старые проекты сохранялись из main.py: класс в них записан как __main__.GraphData (или
+    main.GraphData). Он берется из пакета, чтобы чтение проекта не загружало интерфейс и Qt.
+    """
+    def find_class(self, module, name):
+        if module in ('__main__', 'main') and name == 'GraphData':
+            return GraphData
+        return super().find_class(module, name)
+
+
+def read_project(file_path):
+    """
+    Читает проект и возвращает (список GraphData, состояние журнала).
+    В двоичном формате (v2, v3) данные не читаются, а отображаются в память: страницы столбца попадают в RAM
+    только при обращении к нему. Записи журнала применяются поверх заголовка по порядку,
+    поврежденный хвост журнала (сбой во время сохранения) отбрасывается.
+    Файлы старого формата загружаются через pickle, состояние журнала для них равно None.
+    """
+    with open(file_path, "rb") as file:
+        preamble = file.read(PROJECT_PREAMBLE.size)
+        if not preamble.startswith(PROJECT_MAGIC):
+            file.seek(0)
+            graphs = _ProjectUnpickler(file).load()
+            if not isinstance(graphs, list):
+                raise ValueError("Некорректный формат данных в файле.")
+            return graphs, None
+        metas, journal, buffer = _read_project_header(file, preamble)
+
+    graphs = []
+    for meta in metas:
+        graph_data = GraphData.from_arrays(_map_arrays(buffer, meta), meta['columns'], meta['file_path'],
+                                           meta['index_name'])
+        graph_data.graph_id = meta['id']
+        for field in PROJECT_FIELDS:
+            setattr(graph_data, field, meta[field])
+        graph_data.dirty_fields.clear()  # Состояние совпадает с файлом
+        graphs.append(graph_data)
+    return graphs, journal
+
+
+def _read_project_header(file, preamble):
+    """
+    Заголовок двоичного проекта (v2, v3) с примененными записями журнала: (описания графиков в порядке проекта,
+    состояние журнала, файл, отображенный в память).
+    """
+    if len(preamble) < PROJECT_PREAMBLE.size:
+        raise ValueError("Файл обрезан.")
+    _, version, header_offset, header_size = PROJECT_PREAMBLE.unpack(preamble)
+    if version > PROJECT_VERSION:
+        raise ValueError("Файл создан более новой версией программы.")
+    file.seek(header_offset)
+    header = json.loads(file.read(header_size).decode("utf-8"))
+    metas = {}
+    for meta in header['graphs']:
+        meta.setdefault('id', uuid.uuid4().hex)
+        metas[meta['id']] = meta
+    order = [meta['id'] for meta in header['graphs']]
+
+    # Применяем записи журнала
+    records = 0
+    end = header_offset + header_size
+    file_size = os.fstat(file.fileno()).st_size
+    while end + JOURNAL_RECORD.size <= file_size:
+        file.seek(end)
+        magic, payload_size, crc, data_size = JOURNAL_RECORD.unpack(file.read(JOURNAL_RECORD.size))
+        payload_offset = _align(end + JOURNAL_RECORD.size) + data_size
+        if magic != JOURNAL_MAGIC or payload_offset + payload_size > file_size:
+            break
+        file.seek(payload_offset)
+        payload = file.read(payload_size)
+        if zlib.crc32(payload) != crc:
+            break
+        record = json.loads(payload.decode("utf-8"))
+        for graph_id, meta in record['graphs'].items():
+            metas.setdefault(graph_id, {'id': graph_id}).update(meta)
+        order = record['order']
+        records += 1
+        end = payload_offset + payload_size
+    buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    journal = {'records': records, 'end': end, 'order': order, 'version': version}
+    return [metas[graph_id] for graph_id in order], journal, buffer
+
+
+def _map_arrays(buffer, meta):
+    """Массивы данных графика из описания meta поверх отображенного в память файла"""
+    return {name: _read_array(buffer, description) for name, description in meta['arrays'].items()}
+
+
+def write_project_file(file_path, graphs):
+    """Запись проекта целиком через временный файл и os.replace"""
+    temp_file_path = file_path + ".tmp"
+    try:
+        with open(temp_file_path, "wb") as temp_file:
+            write_project(temp_file, graphs)
+        os.replace(temp_file_path, file_path)
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+def snapshot_graphs(graphs):
+    """
+    Согласованный снимок графиков для записи в другом потоке.
+    Метаданные копируются, а массивы данных берутся по ссылке: они не меняются на месте,
+    при изменении данных график получает новые массивы, поэтому снимок почти ничего не стоит.
+    У графика, в который дописываются строки, values при этом собираются из буферов столбцов,
+    а x и маска присутствия - срезы буферов, в которых меняется только место за их концом.
+    """
+    return [
+        SimpleNamespace(
+            graph_id=graph_data.graph_id,
+            **graph_data.data_arrays(),
+            columns=graph_data.columns,
+            index_name=graph_data.index_name,
+            **{field: copy.deepcopy(getattr(graph_data, field)) for field in PROJECT_FIELDS}
+        )
+        for graph_data in graphs
+    ]
+
+
+def write_autosave(file_path, snapshot, project_name):
+    """Запись автосохранения и файла с описанием, к какому проекту оно относится"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    write_project_file(file_path, snapshot)
+    info_path = os.path.splitext(file_path)[0] + ".json"
+    with open(info_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({'project_name': project_name, 'saved_at': time.time()}, file, ensure_ascii=False)
+    os.replace(info_path + ".tmp", info_path)
+
+
+def remove_autosave(file_path):
+    """Удаляет автосохранение вместе с файлом описания"""
+    for path in (file_path, os.path.splitext(file_path)[0] + ".json"):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _align(offset):
+    return offset + (-offset % PROJECT_ALIGN)
+
+
+def _place_data(graph_data, meta, offset, placed):
+    """
+    Размещает массивы графика начиная с offset: добавляет их описание в meta,
+    а сами массивы с их смещениями в placed. Возвращает смещение после данных.
+    """
+    meta['columns'] = list(graph_data.columns)
+    meta['index_name'] = graph_data.index_name
+    meta['arrays'] = {}
+    for name in GraphData.DATA_ARRAYS:
+        array = np.ascontiguousarray(getattr(graph_data, name))  # Маска дописываемого графика - срез буфера
+        offset = _align(offset)
+        meta['arrays'][name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        placed.append((offset, array))
+        offset += array.nbytes
+    return offset
+
+
+def _write_arrays(file, placed):
+    """Пишет размещенные массивы по их смещениям, заполняя промежутки нулями"""
+    for offset, array in placed:
+        file.write(b"\x00" * (offset - file.tell()))
+        if array.size > 0:
+            file.write(memoryview(array).cast("B"))
+
+
+def _read_array(buffer, description):
+    """Массив поверх отображенной в память области файла, без копирования"""
+    dtype = np.dtype(description['dtype'])
+    count = int(np.prod(description['shape']))
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=description['offset'])
+    return array.reshape(description['shape'])
+
+
+def _json_value(value):
+    """Приведение numpy-скаляров к типам, которые понимает json"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, list):
+        return [_json_value(v) for v in value]
+    return value
+
+
+def array_is_mapped(array):
+    """Массив отображен в память из файла (проекта или выгрузки), а не хранится в RAM"""
+    while array is not None:
+        if isinstance(array, memoryview):
+            array = array.obj
+        if isinstance(array, mmap.mmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+class MemoryManager:
+    """
+    Ограничивает объем данных графиков в RAM.
+    Графики упорядочены по последнему обращению (touch). Когда данные в RAM превышают бюджет,
+    самые давно использованные скрытые графики выгружаются в файл во временном каталоге и дальше
+    читаются из него через отображение в память. При следующем обращении данные снова загружаются в RAM.
+    Данные, уже отображенные из файла проекта, бюджет не расходуют.
+    """
+    def __init__(self, budget=MEMORY_BUDGET, on_evict=None):
+        self.budget = budget
+        self.on_evict = on_evict  # Вызывается перед выгрузкой графика (например, чтобы закрыть его окно)
+        self.graphs = OrderedDict()  # graph_id -> GraphData, от давно использованных к недавним
+        self.spilled = {}  # graph_id -> путь к файлу выгрузки
+        self.reloaded = {}  # graph_id -> массив values, загруженный из файла выгрузки (файл еще актуален)
+        self.evictions = 0
+        self.reloads = 0
+        self.spill_dir = None
+
+    def touch(self, graph_data):
+        """Отметить обращение к данным графика: вернуть их в RAM, если они выгружены"""
+        self.graphs[graph_data.graph_id] = graph_data
+        self.graphs.move_to_end(graph_data.graph_id)
+        # Уже загруженные из выгрузки данные повторно не копируются
+        if graph_data.graph_id in self.spilled and graph_data.graph_id not in self.reloaded:
+            graph_data.swap_data({name: np.array(array) for name, array in graph_data.data_arrays().items()})
+            self.reloaded[graph_data.graph_id] = graph_data.values
+            self.reloads += 1
+        self.enforce()
+
+    def forget(self, graph_data):
+        """График удален из проекта"""
+        self.graphs.pop(graph_data.graph_id, None)
+        self.reloaded.pop(graph_data.graph_id, None)
+        TRANSFORM_CACHE.invalidate(graph_data.graph_id)
+        spill_path = self.spilled.pop(graph_data.graph_id, None)
+        if spill_path is not None:
+            remove_autosave(spill_path)
+
+    def clear(self):
+        for graph_data in list(self.graphs.values()):
+            self.forget(graph_data)
+
+    def resident_size(self):
+        """Объем данных графиков в RAM, байт"""
+        return sum(self._resident_size(graph_data) for graph_data in self.graphs.values())
+
+    def enforce(self):
+        """Выгружает давно использованные скрытые графики, пока данные не поместятся в бюджет"""
+        resident = {graph_id: self._resident_size(g) for graph_id, g in self.graphs.items()}
+        total = sum(resident.values())
+        for graph_id, graph_data in list(self.graphs.items()):
+            if total <= self.budget:
+                break
+            if graph_data.show or resident[graph_id] == 0:
+                continue
+            self._spill(graph_data)
+            total -= resident[graph_id]
+
+    def cleanup(self):
+        """Удаляет каталог выгрузки при выходе"""
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+    def _resident_size(self, graph_data):
+        if graph_data.growing:
+            return graph_data.nbytes  # Буферы дописываемых строк всегда в RAM
+        if graph_data.graph_id in self.spilled and graph_data.graph_id not in self.reloaded:
+            return 0
+        if array_is_mapped(graph_data.values):
+            return 0
+        return graph_data.nbytes
+
+    def _spill(self, graph_data):
+        if self.on_evict is not None:
+            self.on_evict(graph_data)
+        spill_path = self.spilled.get(graph_data.graph_id)
+        # Файл выгрузки переписывается, только если данные изменились после загрузки из него
+        if spill_path is None or self.reloaded.get(graph_data.graph_id) is not graph_data.values:
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix="grapth_spill_")
+            spill_path = os.path.join(self.spill_dir, graph_data.graph_id + ".sgr")
+            write_project_file(spill_path, [graph_data])
+        # Массивы отображаются прямо в этот график: новый GraphData из файла (read_project) записал бы
+        # свои поля и отметил проект измененным, хотя выгрузка проект не меняет
+        with open(spill_path, "rb") as file:
+            (meta,), _, buffer = _read_project_header(file, file.read(PROJECT_PREAMBLE.size))
+        graph_data.swap_data(_map_arrays(buffer, meta))
+        graph_data.lod.clear()  # Пирамиды детализации построятся заново при показе
+        self.spilled[graph_data.graph_id] = spill_path
+        self.reloaded.pop(graph_data.graph_id, None)
+        self.evictions += 1
@@ -0,0 +1,151 @@
+"""
+Передача строк графиков из расчета в запущенный Grapth Researcher через локальный сокет (Unix domain
+socket, который слушает окно программы, см. "Графики" -> "Принимать строки от расчетов").
+
+Поток - последовательность кадров. Кадр - заголовок STREAM_FRAME (тип, длина данных в байтах) и данные:
+- FRAME_HEADER: имена в UTF-8 через нулевой байт: имя графика, имя индекса, затем имена столбцов.
+  Новый заголовок в том же соединении начинает другой график;
+- FRAME_ROWS: пачка строк - float64 little-endian, в каждой строке T и значения столбцов (NaN - нет значения).
+
+Пример из расчета:
+
+    with StreamProducer("run-1", ["H2O", "CO2"]) as producer:
+        producer.send(t_values, values)  # values формы (столбцы, строки)
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+
+import numpy as np
+
+STREAM_SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".grapth_researcher", "stream.sock")  # Сокет сессии
+STREAM_FRAME = struct.Struct('<cI')  # Заголовок кадра: тип и длина данных
+STREAM_MAX_FRAME = 64 * 1024 ** 2  # Максимальная длина данных кадра, байты
+FRAME_HEADER = b'H'  # Кадр с именами графика и столбцов
+FRAME_ROWS = b'R'  # Кадр с пачкой строк
+
+
+class StreamError(ValueError):
+    """Данные потока не соответствуют формату"""
+
+
+def encode_header(name, columns, index_name='T'):
+    payload = "\0".join([name, index_name or ""] + [str(col) for col in columns]).encode("utf-8")
+    return STREAM_FRAME.pack(FRAME_HEADER, len(payload)) + payload
+
+
+def encode_rows(x, y):
+    """Кадр строк: x - значения T, y - блок формы (столбцы, строки), как у GraphData.append_rows"""
+    x = np.asarray(x, dtype='<f8')
+    y = np.asarray(y, dtype='<f8').reshape(-1, len(x))
+    payload = np.column_stack((x, y.T)).astype('<f8', copy=False).tobytes()
+    return STREAM_FRAME.pack(FRAME_ROWS, len(payload)) + payload
+
+
+class StreamDecoder:
+    """
+    Разбор потока по мере поступления байтов: feed добавляет прочитанные байты, next возвращает
+    следующий целый кадр - (FRAME_HEADER, имя, имя индекса, столбцы) или (FRAME_ROWS, x, y) - либо
+    None, если кадр еще не дошел целиком.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.columns = None  # Столбцы последнего заголовка
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next(self):
+        if len(self.buffer) < STREAM_FRAME.size:
+            return None
+        kind, size = STREAM_FRAME.unpack_from(self.buffer)
+        if size > STREAM_MAX_FRAME:
+            raise StreamError(f"слишком большой кадр: {size} байт")
+        end = STREAM_FRAME.size + size
+        if len(self.buffer) < end:
+            return None
+        payload = bytes(self.buffer[STREAM_FRAME.size:end])
+        del self.buffer[:end]
+
+        if kind == FRAME_HEADER:
+            try:
+                names = payload.decode("utf-8").split("\0")
+            except UnicodeDecodeError as e:
+                raise StreamError(f"заголовок не в UTF-8: {e}") from None
+            if len(names) < 2 or not names[0]:
+                raise StreamError("в заголовке нет имени графика")
+            self.columns = tuple(names[2:])
+            return FRAME_HEADER, names[0], names[1] or None, self.columns
+        if kind == FRAME_ROWS:
+            if self.columns is None:
+                raise StreamError("строки пришли раньше заголовка")
+            width = len(self.columns) + 1
+            if size % (8 * width):
+                raise StreamError(f"длина пачки строк не кратна строке из {width} чисел")
+            rows = np.frombuffer(payload, dtype='<f8').reshape(-1, width)
+            return FRAME_ROWS, rows[:, 0], rows[:, 1:].T
+        raise StreamError(f"неизвестный тип кадра {kind!r}")
+
+
+class StreamProducer:
+    """
+    Клиент для расчетов: открывает поток в запущенной сессии и отправляет пачки строк. Если сессия
+    не успевает рисовать, она перестает читать сокет и send блокируется, пока данные не разберут.
+    """
+    def __init__(self, name, columns, index_name='T', path=STREAM_SOCKET_PATH):
+        self.columns = tuple(columns)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(path)
+            self.socket.sendall(encode_header(name, self.columns, index_name))
+        except OSError:
+            self.socket.close()
+            raise
+
+    def send(self, x, y):
+        self.socket.sendall(encode_rows(x, y))
+
+    def close(self):
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def stream_main(argv):
+    """Заглушка расчета: отправляет строки CSV файла в сессию пачками, python -m grapth_core.stream"""
+    import pandas as pd
+    parser = argparse.ArgumentParser(
+        prog="python -m grapth_core.stream",
+        description="Отправка строк CSV файла в запущенный Grapth Researcher пачками, как их отправлял бы расчет."
+    )
+    parser.add_argument("file", help="CSV файл")
+    parser.add_argument("--name", help="Имя графика (по умолчанию - путь к файлу)")
+    parser.add_argument("--batch", type=int, default=100, help="Строк в пачке")
+    parser.add_argument("--interval", type=float, default=0.05, help="Пауза между пачками, с")
+    parser.add_argument("--socket", default=STREAM_SOCKET_PATH, help="Сокет сессии")
+    options = parser.parse_args(argv)
+    batch = max(options.batch, 1)
+
+    data = pd.read_csv(options.file, index_col=0)
+    x = data.index.to_numpy(dtype=np.float64)
+    y = data.to_numpy(dtype=np.float64).T
+    try:
+        with StreamProducer(options.name or options.file, data.columns, data.index.name, options.socket) as producer:
+            for start in range(0, len(x), batch):
+                producer.send(x[start:start + batch], y[:, start:start + batch])
+                time.sleep(options.interval)
+    except OSError as e:
+        print(f"Не удалось передать строки: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(stream_main(sys.argv[1:]))
@@ -1,83 +1,583 @@
 import sys
 import os
+import gc
+import json
 import pickle
-import pandas as pd
+import time
+import threading
+import math
+import uuid
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QSplitter, QWidget, QVBoxLayout,
-    QTableWidget, QTableWidgetItem, QMenuBar, QPushButton, QHBoxLayout,
-    QHeaderView, QFileDialog, QCheckBox, QDialog, QLabel, QLineEdit,
-    QSizePolicy, QAbstractItemView, QMessageBox, QComboBox
+    QMenuBar, QPushButton, QHBoxLayout,
+    QHeaderView, QFileDialog, QDialog, QLabel, QLineEdit,
+    QSizePolicy, QAbstractItemView, QMessageBox, QComboBox, QProgressDialog, QInputDialog, QSpinBox,
+    QTableView, QStackedWidget
+)
+from PySide6.QtGui import QAction, QIcon, QDoubleValidator, QColor
+from PySide6.QtCore import (
+    Qt, QSize, QObject, QThread, QTimer, QLockFile, Signal, QAbstractTableModel, QModelIndex,
+    QItemSelection, QItemSelectionModel
 )
-from PySide6.QtGui import QAction, QIcon, QDoubleValidator
-from PySide6.QtCore import Qt, QSize
+from PySide6.QtNetwork import QLocalServer, QLocalSocket
 import pyqtgraph as pg
 from pyqtgraph.exporters import ImageExporter
-import numpy as np
-
-IS_SAVE = True  # Флаг, показывающий, сохранен ли проект
-UNITS = ['y', 'ln(y)', 'lg(y)']
-
-class GraphData:
-    """Класс для хранения данных о каждом графике"""
-    def __init__(self, data: pd.DataFrame, file_path: str, show: bool = True, scalable: bool = True):
-        self.data = data  # Данные из файла
-        self.file_path = file_path  # Путь к файлу
-        self.file_name = file_path.split("/")[-1].split(".")[0]  # Название файла без расширения
-        self.show = show  # Показывать ли график
-        self.scalable = scalable  # Возможность масштабирования
-        self.graph_window = None  # Окно для отображения графика
-        self.graph_table = None  # Объект таблицы-списка графиков
-        self.graph_field = None  # Объект поля графика
-        self.graphics_visible = []  # Какие из графиков будут показываться
-        self.scale_x_min = 273
-        self.scale_x_max = 2000
-        self.scale_y_min = 0
-        self.scale_y_max = 0
-        self.units_list = UNITS
-        self.unit_initial = 0
-        self.unit_final = 0
-        self.unit_to = [self.u_1_1, self.u_2_1, self.u_3_1]
-        self.unit_from = [self.u_1_1, self.u_1_2, self.u_1_3]
-
-    def __setattr__(self, name, value):
-        global IS_SAVE
-        IS_SAVE = False
-        super().__setattr__(name, value)
 
-    def __getstate__(self):
-        """Определяет, какие данные будут сериализованы."""
-        state = self.__dict__.copy()
-        state['graph_window'] = None  # Устанавливаем None вместо ссылки на окно
-        state['graph_table'] = None
-        state['graph_field'] = None
-        return state
-
-    def __setstate__(self, state):
-        """Определяет, как объект восстанавливается из сериализованных данных."""
-        self.__dict__.update(state)
-        self.graph_window = None  # После восстановления, окно не существует
-        self.graph_table = None  # Объект таблицы-списка графиков
-        self.graph_field = None  # Объект поля графика
+from grapth_core import (
+    UNITS, GraphData, SpeciesIndex, CSV_CHUNK_SIZE, AUTOSAVE_DIR, LoadCanceled, load_csv, load_csv_file, CsvTail,
+    read_project, write_project, append_project_changes, map_project_arrays, project_needs_compaction,
+    snapshot_graphs, write_autosave, remove_autosave, MemoryManager, array_is_mapped,
+)
+from grapth_core.stream import STREAM_SOCKET_PATH, FRAME_HEADER, StreamError, StreamDecoder
 
-    # def __repr__(self):
-    #     return f"GraphData({self.file_name}, show={self.show}, scalable={self.scalable})"
+IS_SAVE = True  # Флаг, показывающий, сохранен ли проект
+AUTOSAVE_INTERVAL = 2 * 60 * 1000  # Период автосохранения, мс
+LOD_POINTS_PER_PIXEL = 2  # Сколько точек кривой приходится на пиксель ширины окна (минимум и максимум)
+CURVE_STYLE = ("gray", 1)  # Цвет и z обычной кривой
+HIGHLIGHT_STYLE = ("red", 2)  # Цвет и z кривой, выделенной в таблице (самый верхний слой)
+BATCH_CURVES = True  # Рисовать кривые одного стиля одним элементом (см. CurveSet)
+LINK_X_AXES = False  # Панорамирование и масштаб по X в окне масштабируемого графика переносятся на остальные
+RANGE_UPDATE_INTERVAL = 16  # мс; изменения диапазонов окон применяются не чаще раза за это время (кадр)
+GRID_MODE = False  # Все графики - ячейки одной сетки в главном окне вместо отдельного окна на график
+STORAGE_DTYPE = np.float64  # Тип значений графиков в памяти; float32 вдвое меньше, если данные нужны только для графиков
+TOP_GRAPHS_COUNT = 10  # Сколько соединений с наибольшим пиком показывать по умолчанию
+RENDER_SIZE = (1200, 600)  # Ширина и высота изображений пакетной отрисовки (python main.py render), пиксели
+WATCH_FPS = 5  # Сколько раз в секунду дочитываются CSV, за дописыванием которых следит программа
+STREAM_SERVER = False  # Принимать строки от расчетов через локальный сокет (см. grapth_core.stream)
+STREAM_READ_CHUNK = 1024 ** 2  # Сколько байт потока читается из сокета за раз (и буфер сокета Qt)
+STREAM_PENDING_ROWS = 100000  # Принятых, но еще не дописанных строк потока; больше - чтение сокета ждет кадра
+
+
+def mark_unsaved():
+    """Данные графика изменились после последнего сохранения проекта"""
+    global IS_SAVE
+    IS_SAVE = False
+
+
+GraphData.on_change = mark_unsaved
+
+
+class CsvLoadWorker(QObject):
+    """Чтение CSV файла в фоновом потоке"""
+    progress = Signal(int)  # Процент прочитанного файла
+    finished = Signal(object)  # Готовый GraphData
+    failed = Signal(str)  # Текст ошибки
+    canceled = Signal()
+
+    def __init__(self, file_path, chunk_size=CSV_CHUNK_SIZE):
+        super().__init__()
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self._cancel_requested = False
 
-    def u_1_1(self, y):
-        return y
+    def cancel(self):
+        """Вызывается из потока интерфейса, поэтому только выставляет флаг"""
+        self._cancel_requested = True
 
-    def u_1_2(self, y):
-        # print(y)
-        return np.where(y > 0, np.log(y), -1e10)
+    def run(self):
+        try:
+            graph_data = load_csv(
+                self.file_path,
+                self.chunk_size,
+                on_progress=self.progress.emit,
+                is_canceled=lambda: self._cancel_requested
+            )
+        except LoadCanceled:
+            self.canceled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(graph_data)
 
-    def u_1_3(self, y):
-        # print(y)
-        return np.where(y > 0, np.log10(y), -1e10)
 
-    def u_2_1(self, y):
-        return np.exp(y)
+class BatchLoadWorker(QObject):
+    """Параллельное чтение нескольких CSV файлов в пуле процессов"""
+    progress = Signal(int)  # Процент обработанных файлов
+    finished = Signal(object)  # Кортеж (список GraphData в порядке выбора файлов, список ошибок)
+    failed = Signal(str)
+    canceled = Signal()
 
-    def u_3_1(self, y):
-        return np.power(10, y)
+    def __init__(self, file_paths):
+        super().__init__()
+        self.file_paths = list(file_paths)
+        self._cancel_requested = False
+
+    def cancel(self):
+        """Вызывается из потока интерфейса, поэтому только выставляет флаг"""
+        self._cancel_requested = True
+
+    def run(self):
+        # spawn вместо fork: родительский процесс многопоточный (Qt), fork в нем небезопасен
+        pool = ProcessPoolExecutor(
+            max_workers=min(len(self.file_paths), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        try:
+            futures = {pool.submit(load_csv_file, path): i for i, path in enumerate(self.file_paths)}
+            results = [None] * len(self.file_paths)
+            errors = []
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                if self._cancel_requested:
+                    self.canceled.emit()  # Оставшиеся задачи снимаются в finally
+                    return
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    errors.append(f"{os.path.basename(self.file_paths[index])}: {e}")
+                self.progress.emit(done_count * 100 // len(self.file_paths))
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(([g for g in results if g is not None], errors))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BackgroundLoader(QObject):
+    """Запускает воркер загрузки в отдельном потоке и показывает прогресс с кнопкой отмены"""
+    loaded = Signal(object)  # Результат воркера, передается уже в потоке интерфейса
+    failed = Signal(str)
+    done = Signal()  # Загрузка завершена любым способом
+
+    def __init__(self, worker, label, parent):
+        super().__init__(parent)
+        self.worker = worker
+        self.thread = QThread()
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        # Слоты этого объекта выполняются в потоке интерфейса
+        self.worker.progress.connect(self._on_progress)
+        self.worker.finished.connect(self._on_finished)
+        self.worker.failed.connect(self._on_failed)
+        self.worker.canceled.connect(self._on_canceled)
+
+        self.dialog = QProgressDialog(label, "Отмена", 0, 100, parent)
+        self.dialog.setWindowModality(Qt.NonModal)  # Окно не блокирует работу с остальными графиками
+        self.dialog.setMinimumDuration(300)  # Для маленьких файлов окно не успеет появиться
+        self.dialog.setAutoClose(False)
+        self.dialog.setAutoReset(False)
+        self.dialog.canceled.connect(self.cancel)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        # Флаг выставляется напрямую: очередь событий потока занята чтением файла
+        self.worker.cancel()
+
+    def stop(self):
+        """Отменить загрузку и дождаться завершения потока (при закрытии приложения)"""
+        self.worker.cancel()
+        self.thread.quit()
+        self.thread.wait()
+
+    def _on_progress(self, value):
+        self.dialog.setValue(value)
+
+    def _on_finished(self, result):
+        self._finish()
+        self.loaded.emit(result)
+
+    def _on_failed(self, message):
+        self._finish()
+        self.failed.emit(message)
+
+    def _on_canceled(self):
+        self._finish()
+
+    def _finish(self):
+        self.thread.quit()
+        self.thread.wait()
+        self.dialog.close()
+        self.done.emit()
+
+
+class SpeciesModel(QAbstractTableModel):
+    """
+    Таблица соединений окна графика: строка 0 - общий флажок "Все", строка i + 1 - столбец i.
+    Флажки читаются прямо из graph_data.graphics_visible, а представление запрашивает только
+    видимые строки, поэтому окно с тысячами соединений открывается так же быстро, как с десятком.
+    """
+    visibility_changed = Signal(object)  # Номера столбцов, у которых изменилась видимость
+    HEADERS = ("", "Соединение")
+
+    def __init__(self, graph_data, parent=None):
+        super().__init__(parent)
+        self.graph_data = graph_data
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.graph_data.columns) + 1
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if index.column() == 0:
+            return Qt.ItemIsEnabled | Qt.ItemIsUserCheckable  # Флажок не выделяет строку
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        row = index.row()
+        if index.column() == 1 and role == Qt.DisplayRole:
+            return "Все" if row == 0 else self.graph_data.columns[row - 1]
+        if index.column() == 0 and role == Qt.CheckStateRole:
+            visible = self.graph_data.graphics_visible
+            is_visible = all(visible) if row == 0 else visible[row - 1]
+            return Qt.Checked if is_visible else Qt.Unchecked
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if index.column() != 0 or role != Qt.CheckStateRole:
+            return False
+        is_visible = Qt.CheckState(value) == Qt.Checked
+        if index.row() == 0:
+            self.set_visibility([is_visible] * len(self.graph_data.columns))
+            return True
+        self.graph_data.graphics_visible[index.row() - 1] = is_visible
+        self.graph_data.mark_dirty('graphics_visible')
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.dataChanged.emit(self.index(0, 0), self.index(0, 0), [Qt.CheckStateRole])
+        self.visibility_changed.emit([index.row() - 1])
+        return True
+
+    def set_visibility(self, visible):
+        """Задать видимость всех столбцов одним изменением модели и одной перерисовкой"""
+        self.graph_data.graphics_visible = list(visible)
+        self.dataChanged.emit(self.index(0, 0), self.index(len(visible), 0), [Qt.CheckStateRole])
+        self.visibility_changed.emit(range(len(visible)))
+
+
+class GraphListModel(QAbstractTableModel):
+    """
+    Список графиков проекта в главном окне. Строки ссылаются на общий с окном список graphs
+    и вставляются и удаляются на месте; строка графика находится по graph_id через словарь,
+    поэтому одинаковые имена файлов не путаются.
+    """
+    visibility_toggled = Signal(object, bool)  # GraphData, показывать ли окно
+    delete_requested = Signal(object)  # GraphData
+    HEADERS = ("График", "Показать", "Масштаб", "Удалить")
+
+    def __init__(self, graphs, parent=None):
+        super().__init__(parent)
+        self.graphs = graphs
+        self.rows = {}  # graph_id -> номер строки
+        self._reindex(0)
+
+    def _reindex(self, start):
+        for row in range(start, len(self.graphs)):
+            self.rows[self.graphs[row].graph_id] = row
+
+    def set_graphs(self, graphs):
+        """Заменить весь список (открытие проекта)"""
+        self.beginResetModel()
+        self.graphs = graphs
+        self.rows = {}
+        self._reindex(0)
+        self.endResetModel()
+
+    def append(self, graphs):
+        start = len(self.graphs)
+        self.beginInsertRows(QModelIndex(), start, start + len(graphs) - 1)
+        self.graphs.extend(graphs)
+        self._reindex(start)
+        self.endInsertRows()
+
+    def remove(self, graph_data):
+        row = self.rows.pop(graph_data.graph_id)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.graphs[row]
+        self._reindex(row)
+        self.endRemoveRows()
+
+    def row(self, graph_data):
+        """Номер строки графика или None"""
+        return self.rows.get(graph_data.graph_id)
+
+    def refresh(self, graph_data):
+        """Перерисовать строку графика после изменения его полей"""
+        row = self.row(graph_data)
+        if row is not None:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.graphs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if index.column() in (1, 2):
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+        if index.column() == 3:
+            return Qt.ItemIsEnabled  # Щелчок удаляет график, а не выделяет строку
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        graph_data = self.graphs[index.row()]
+        column = index.column()
+        if column == 0 and role == Qt.DisplayRole:
+            return graph_data.file_name
+        if column in (1, 2) and role == Qt.CheckStateRole:
+            checked = graph_data.show if column == 1 else graph_data.scalable
+            return Qt.Checked if checked else Qt.Unchecked
+        if column == 3 and role == Qt.DecorationRole:
+            return QColor("red")
+        if column == 3 and role == Qt.ToolTipRole:
+            return "Удалить график"
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if index.column() not in (1, 2) or role != Qt.CheckStateRole:
+            return False
+        graph_data = self.graphs[index.row()]
+        checked = Qt.CheckState(value) == Qt.Checked
+        if index.column() == 1:
+            self.visibility_toggled.emit(graph_data, checked)
+        else:
+            graph_data.scalable = checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+
+class CurveSet:
+    """
+    Кривые одного окна графика. У каждого столбца есть своя кривая, но в режиме объединения
+    (batch) все видимые столбцы одного стиля рисуются одним элементом: их точки склеиваются,
+    а массив connect разрывает линию между столбцами. Тогда перерисовка почти не зависит от
+    числа соединений. Отдельными остаются только выделенные кривые (HIGHLIGHT_STYLE).
+    Кривые столбцов создаются при первой надобности и добавляются прямо в ViewBox:
+    PlotItem.addItem обходит все уже добавленные элементы, и тысячи кривых добавлялись бы за O(n^2).
+    """
+    def __init__(self, plot_widget, columns, batch=BATCH_CURVES):
+        self.plot_widget = plot_widget
+        self.batch = batch
+        self.columns = columns
+        self.curves = [None] * len(columns)
+        self.styles = [False] * len(columns)  # (цвет, z), None - кривая скрыта, False - стиль еще не задан
+        self.points = [None] * len(columns)  # Последние точки (x, y, connect) каждого столбца
+        self.batches = {}  # Стиль -> общий элемент для столбцов этого стиля
+        self.changed_batches = set()
+
+    def batched(self, style):
+        return bool(style) and self.batch and style != HIGHLIGHT_STYLE
+
+    def set_style(self, i, style):
+        """Меняет стиль кривой столбца i. Возвращает True, если ее точки устарели и их нужно задать"""
+        previous = self.styles[i]
+        if style == previous:
+            return False
+        self.styles[i] = style
+        if self.batched(previous):
+            self.changed_batches.add(previous)
+        if style is None or self.batched(style):
+            if self.curves[i] is not None:
+                self.curves[i].setVisible(False)
+            if style:
+                self.changed_batches.add(style)
+        else:
+            curve = self.curve(i)
+            color, z_value = style
+            curve.setPen(pg.mkPen(color=color, width=2))
+            curve.setZValue(z_value)
+            if self.batched(previous) and self.points[i] is not None:
+                self._set_curve_points(i)  # Пока столбец был в общем элементе, его кривая не обновлялась
+            curve.setVisible(True)
+        return not previous  # Пока кривая была скрыта, ее точки не обновлялись
+
+    def curve(self, i):
+        """Отдельная кривая столбца i"""
+        if self.curves[i] is None:
+            self.curves[i] = pg.PlotDataItem(name=self.columns[i])
+            self.curves[i].setVisible(False)
+            self.plot_widget.getViewBox().addItem(self.curves[i])
+        return self.curves[i]
+
+    def set_points(self, i, x, y, connect):
+        self.points[i] = (x, y, connect)
+        if self.batched(self.styles[i]):
+            self.changed_batches.add(self.styles[i])
+        else:
+            self._set_curve_points(i)
+
+    def set_batch(self, batch):
+        """Включение и выключение режима объединения: все кривые заново распределяются по элементам"""
+        self.batch = batch
+        for i, style in enumerate(self.styles):
+            self.styles[i] = False
+            self.set_style(i, style)
+            if style and not self.batched(style) and self.points[i] is not None:
+                self._set_curve_points(i)
+        self.changed_batches.update(self.batches)
+        self.update()
+
+    def update(self):
+        """Пересобирает общие элементы, в которых изменился состав или точки столбцов"""
+        for style in self.changed_batches:
+            item = self.batches.get(style)
+            if item is None:
+                color, z_value = style
+                item = self.batches[style] = self.plot_widget.plot(pen=pg.mkPen(color=color, width=2))
+                item.setZValue(z_value)
+            parts = [
+                self.points[i] for i, column_style in enumerate(self.styles)
+                if column_style == style and self.batch and self.points[i] is not None
+            ]
+            if not parts:
+                item.setData([], [])
+                continue
+            connect = []
+            for x, _, column_connect in parts:
+                column_connect = np.ones(len(x), dtype=bool) if isinstance(column_connect, str) else column_connect
+                column_connect = column_connect.copy()
+                column_connect[-1:] = False  # Разрыв между столбцами
+                connect.append(column_connect)
+            item.setData(np.concatenate([x for x, _, _ in parts]), np.concatenate([y for _, y, _ in parts]),
+                         connect=np.concatenate(connect))
+        self.changed_batches.clear()
+
+    def _set_curve_points(self, i):
+        x, y, connect = self.points[i]
+        self.curve(i).setData(x, y, connect=connect)
+
+
+class GraphView:
+    """
+    Виджеты графика в интерфейсе. GraphData о них не знает: главное окно хранит их в словаре
+    graph_id -> GraphView, пока у графика есть окно.
+    """
+    __slots__ = ('window', 'table', 'field', 'curves')
+
+    def __init__(self, window=None, table=None, field=None, curves=None):
+        self.window = window  # Окно графика или ячейка сетки (GridCell)
+        self.table = table  # Таблица соединений
+        self.field = field  # Поле графика (PlotWidget, в сетке - PlotItem)
+        self.curves = curves  # Кривые поля (CurveSet)
+
+
+class StreamSession:
+    """Соединение расчета, который передает строки через локальный сокет (см. grapth_core.stream)"""
+    __slots__ = ('socket', 'decoder', 'graph_data', 'pending', 'pending_rows', 'closed')
+
+    def __init__(self, socket):
+        self.socket = socket  # QLocalSocket
+        self.decoder = StreamDecoder()
+        self.graph_data = None  # График последнего заголовка; None - строки отбрасываются (график удален)
+        self.pending = []  # Пачки (x, y), которые допишутся в график на следующем кадре
+        self.pending_rows = 0
+        self.closed = False  # Расчет отключился, осталось дописать прочитанное
+
+
+class GridCell:
+    """
+    Место графика в общей сетке (GRID_MODE). Стоит в GraphView.window вместо отдельного окна и
+    повторяет ту часть интерфейса окна, которой пользуется MainWindow: show, hide, isVisible,
+    close (с обработчиком closeEvent) и deleteLater.
+    """
+    def __init__(self, grid, plot_widget, species_widget):
+        self.grid = grid
+        self.plot_widget = plot_widget
+        self.species_widget = species_widget
+        self.visible = False
+        self.closeEvent = None
+
+    def show(self):
+        self.visible = True
+        self.grid.schedule_relayout()
+
+    def hide(self):
+        self.visible = False
+        self.grid.schedule_relayout()
+
+    def isVisible(self):
+        return self.visible and self.grid.isVisible()
+
+    def close(self):
+        self.hide()
+        if self.closeEvent is not None:
+            self.closeEvent(None)
+
+    def deleteLater(self):
+        self.grid.remove(self)
+
+
+class GraphGrid(QSplitter):
+    """
+    Режим одного окна: графики - ячейки одного GraphicsLayoutWidget (одна сцена и один цикл
+    перерисовки на все графики вместо окна, сцены и QGraphicsView на каждый), справа - панель
+    соединений графика, выбранного щелчком. Таблицы соединений остаются у каждого графика свои,
+    панель только переключает их, поэтому выделение и флажки сохраняются.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.canvas = pg.GraphicsLayoutWidget()
+        self.canvas.setBackground("w")
+        self.species_panel = QStackedWidget()
+        self.addWidget(self.canvas)
+        self.addWidget(self.species_panel)
+        self.setStretchFactor(0, 1)
+        self.cells = []
+        self.current = None  # Выбранная ячейка, ее соединения показаны в панели
+        self.canvas.scene().sigMouseClicked.connect(self.on_clicked)
+        # Сетка перестраивается один раз после серии показов и скрытий (например, открытия проекта)
+        self.relayout_timer = QTimer(self)
+        self.relayout_timer.setSingleShot(True)
+        self.relayout_timer.timeout.connect(self.relayout)
+
+    def add(self, plot_widget, species_widget):
+        cell = GridCell(self, plot_widget, species_widget)
+        self.cells.append(cell)
+        self.species_panel.addWidget(species_widget)
+        self.select(cell)
+        return cell
+
+    def remove(self, cell):
+        self.cells.remove(cell)
+        # График ячейки снимается со сцены сразу, не дожидаясь перестройки сетки
+        if cell.plot_widget in self.canvas.ci.items:
+            self.canvas.ci.removeItem(cell.plot_widget)
+        self.species_panel.removeWidget(cell.species_widget)
+        cell.species_widget.deleteLater()
+        if self.current is cell:
+            self.select(next((other for other in self.cells if other.visible), None))
+        self.schedule_relayout()
+
+    def schedule_relayout(self):
+        self.relayout_timer.start(0)
+
+    def relayout(self):
+        """Расставляет видимые ячейки по почти квадратной сетке"""
+        layout = self.canvas.ci
+        layout.clear()
+        visible = [cell for cell in self.cells if cell.visible]
+        columns = max(1, math.ceil(math.sqrt(len(visible))))
+        for position, cell in enumerate(visible):
+            layout.addItem(cell.plot_widget, row=position // columns, col=position % columns)
+
+    def select(self, cell):
+        self.current = cell
+        if cell is not None:
+            self.species_panel.setCurrentWidget(cell.species_widget)
+
+    def on_clicked(self, event):
+        for cell in self.cells:
+            if cell.visible and cell.plot_widget.sceneBoundingRect().contains(event.scenePos()):
+                self.select(cell)
+                return
 
 
 class MainWindow(QMainWindow):
@@ -92,9 +592,52 @@ class MainWindow(QMainWindow):
 
         # Главная структура данных для хранения графиков
         self.graphs = []
+        self.views = {}  # graph_id -> GraphView графиков, у которых есть окно
+        self.loaders = []  # Фоновые загрузки CSV, которые еще идут
+        self.memory = MemoryManager(on_evict=self.release_graph_window)  # Бюджет RAM для данных графиков
+        self.pending_dtype = set()  # graph_id графиков, которые переводятся в STORAGE_DTYPE при следующем показе
+        self.species_index = SpeciesIndex()  # Соединения всех графиков для поиска
+        # Изменения диапазонов окон копятся и применяются одним проходом (см. set_graph_range)
+        self.pending_ranges = {}  # graph_id -> [GraphData, x_range, y_range, padding]
+        self.applying_ranges = False
+        self.range_timer = QTimer(self)
+        self.range_timer.setSingleShot(True)
+        self.range_timer.setInterval(RANGE_UPDATE_INTERVAL)
+        self.range_timer.timeout.connect(self.apply_pending_ranges)
+        # Слежение за CSV, которые еще дописываются расчетом: новые строки дочитываются таймером
+        # не чаще WATCH_FPS раз в секунду, все строки, пришедшие между срабатываниями, - одним куском
+        self.watched = {}  # graph_id -> (GraphData, CsvTail)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(1000 // WATCH_FPS)
+        self.watch_timer.timeout.connect(self.poll_watched)
+        # Потоки строк от расчетов: пачки всех соединений копятся и дописываются в графики одним
+        # проходом за кадр (RANGE_UPDATE_INTERVAL). Пока строк накоплено больше STREAM_PENDING_ROWS,
+        # сокет не читается, его буфер заполняется и отправка у расчета блокируется
+        self.stream_server = None  # QLocalServer, пока прием включен
+        self.streams = []  # StreamSession
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setSingleShot(True)
+        self.stream_timer.setInterval(RANGE_UPDATE_INTERVAL)
+        self.stream_timer.timeout.connect(self.apply_streams)
 
         self.current_grapth_index = None  # Выделенный график для изменения масштаба
         self.project_name = None  # Путь и имя для файла проекта
+        self.project_journal = None  # Состояние журнала открытого проекта .sgr (см. read_project)
+
+        # Автосохранение: у каждого запущенного экземпляра своя копия, занятая блокировкой
+        os.makedirs(AUTOSAVE_DIR, exist_ok=True)
+        # Имя копии случайное: pid завершившегося аварийно экземпляра может достаться новому, и тот
+        # занял бы чужую копию вместо того, чтобы предложить ее восстановить
+        self.autosave_path = os.path.join(AUTOSAVE_DIR, f"autosave-{uuid.uuid4().hex}.sgr")
+        self.autosave_lock = QLockFile(self.autosave_path + ".lock")
+        self.autosave_lock.tryLock(0)  # Без блокировки автосохранение не пишется (см. autosave)
+        self.autosave_thread = None  # Поток, который пишет текущее автосохранение
+        self.recovered_autosaves = []  # Восстановленные копии (lock, путь), удаляются при выходе
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(AUTOSAVE_INTERVAL)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start()
+        QTimer.singleShot(0, self.recover_autosave)  # После показа главного окна
 
         # Задаем общий масштаб всех графиков
         self.scale_x_min = 999999999999
@@ -104,6 +647,8 @@ class MainWindow(QMainWindow):
 
         # Меню
         self.create_menu()
+        if STREAM_SERVER:
+            self.set_stream_server(True)
 
         # Сплиттер и основные элементы
         splitter = QSplitter(Qt.Horizontal)
@@ -167,6 +712,17 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(y_button)
         left_layout.addLayout(button_layout)
 
+        # Поиск соединений сразу во всех графиках
+        species_layout = QHBoxLayout()
+        self.species_input = QLineEdit()
+        self.species_input.setPlaceholderText("Соединения: Na2SO4, SiO2*, *SO4*")
+        species_layout.addWidget(self.species_input)
+        for text, action in (("Показать", 'show'), ("Скрыть", 'hide'), ("Только эти", 'only'), ("Выделить", 'highlight')):
+            species_button = QPushButton(text)
+            species_button.clicked.connect(lambda checked=False, action=action: self.apply_species_query(action))
+            species_layout.addWidget(species_button)
+        left_layout.addLayout(species_layout)
+
         self.container_widget = QWidget()
         self.container_widget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.container_widget.setVisible(False)  # Скрываем контейнер по умолчанию
@@ -181,6 +737,10 @@ class MainWindow(QMainWindow):
         # Пустое текстовое поле, содержание которого можно обновлять
         self.current_graph_name_label = QLabel("")
         current_graph_layout.addWidget(self.current_graph_name_label)
+        self.watch_button = QPushButton("Следить за дописыванием файла")
+        self.watch_button.setCheckable(True)
+        self.watch_button.toggled.connect(self.on_watch_toggled)
+        current_graph_layout.addWidget(self.watch_button)
 
         # Добавляем горизонтальный лейаут в контейнер
         container_layout.addLayout(current_graph_layout)
@@ -267,7 +827,7 @@ class MainWindow(QMainWindow):
 
         right_widget = QWidget()  # Правая колонка (таблица и кнопка)
         right_layout = QVBoxLayout(right_widget)
-        self.table = QTableWidget()  # Таблица для правой колонки
+        self.table = QTableView()  # Таблица для правой колонки
         self.table.setSelectionMode(QAbstractItemView.SingleSelection)  # Разрешаем выделение только одной строки
         self.setup_table()
         right_layout.addWidget(self.table)
@@ -284,8 +844,13 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(add_button)
         right_layout.addLayout(button_layout)
 
+        # Сетка графиков для режима одного окна (GRID_MODE)
+        self.graph_grid = GraphGrid()
+        self.graph_grid.setVisible(GRID_MODE)
+
         # Установка сплиттера и центрального виджета
         splitter.addWidget(left_widget)
+        splitter.addWidget(self.graph_grid)
         splitter.addWidget(right_widget)
         central_widget = QWidget()
         layout = QVBoxLayout(central_widget)
@@ -296,7 +861,7 @@ class MainWindow(QMainWindow):
         # Перерисовать исходя из смены единиц
         gr = self.graphs[self.current_grapth_index]
         gr.unit_initial = index
-        self.rewrite_graph(gr)
+        self.refresh_curves(gr)  # Стиль кривых не меняется, пересчитываются только значения y
 
         
         # uuuu
@@ -307,14 +872,17 @@ class MainWindow(QMainWindow):
         # Перерисовать исходя из смены единиц
         gr = self.graphs[self.current_grapth_index]
         gr.unit_final = index
-        gr.graph_field.setLabel('left', gr.units_list[gr.unit_final], units='')  # Меняем подпись для оси Y
-        self.rewrite_graph(gr)
+        view = self.views.get(gr.graph_id)
+        if view is not None:
+            view.field.setLabel('left', gr.units_list[gr.unit_final], units='')  # Меняем подпись для оси Y
+        self.refresh_curves(gr)  # Стиль кривых не меняется, пересчитываются только значения y
 
 
     def closeEvent(self, event):
         """ Срабатывает при закрытии главного окна """
         global IS_SAVE
         if IS_SAVE is True:
+            self.stop_background_tasks()
             event.accept()  # Подтверждаем закрытие
             return
         reply = QMessageBox.question(
@@ -325,10 +893,94 @@ class MainWindow(QMainWindow):
             QMessageBox.No
         )
         if reply == QMessageBox.Yes:
+            self.stop_background_tasks()
             event.accept()  # Подтверждаем закрытие
         else:
             event.ignore()  # Отменяем закрытие
 
+    def stop_background_tasks(self):
+        """Прерывает фоновые загрузки и убирает автосохранения при штатном выходе"""
+        for loader in self.loaders:
+            loader.stop()
+        self.loaders.clear()
+        self.watch_timer.stop()
+        self.set_stream_server(False)
+        self.autosave_timer.stop()
+        self.discard_autosave()
+        for lock, path in self.recovered_autosaves:
+            remove_autosave(path)
+            lock.unlock()
+        self.recovered_autosaves.clear()
+        self.autosave_lock.unlock()
+        self.memory.cleanup()
+
+    def autosave(self):
+        """Автосохранение несохраненного проекта в фоновом потоке"""
+        if IS_SAVE is True or len(self.graphs) == 0 or not self.autosave_lock.isLocked():
+            return
+        if self.autosave_thread is not None and self.autosave_thread.is_alive():
+            return  # Предыдущее автосохранение еще пишется
+        # Снимок делается в потоке интерфейса, поэтому дальнейшие правки в него не попадут
+        snapshot = snapshot_graphs(self.graphs)
+        self.autosave_thread = threading.Thread(
+            target=write_autosave, args=(self.autosave_path, snapshot, self.project_name), daemon=True)
+        self.autosave_thread.start()
+
+    def discard_autosave(self):
+        """Удаляет автосохранение после сохранения проекта"""
+        if self.autosave_thread is not None:
+            self.autosave_thread.join()
+            self.autosave_thread = None
+        if self.autosave_lock.isLocked():
+            remove_autosave(self.autosave_path)
+
+    def recover_autosave(self):
+        """Предлагает восстановить автосохранения экземпляров программы, завершившихся аварийно"""
+        global IS_SAVE
+        candidates = []
+        for name in os.listdir(AUTOSAVE_DIR):
+            path = os.path.join(AUTOSAVE_DIR, name)
+            if not name.endswith(".sgr") or path == self.autosave_path:
+                continue
+            lock = QLockFile(path + ".lock")
+            if not lock.tryLock(0):
+                continue  # Копия принадлежит запущенному экземпляру программы
+            candidates.append((os.path.getmtime(path), path, lock))
+
+        for saved_at, path, lock in sorted(candidates, reverse=True):
+            try:
+                with open(os.path.splitext(path)[0] + ".json", encoding="utf-8") as file:
+                    project_name = json.load(file)['project_name']
+            except (OSError, ValueError, KeyError):
+                project_name = None
+            reply = QMessageBox.question(
+                self,
+                "Восстановление проекта",
+                f"Найдено автосохранение проекта {project_name or '(не сохранен)'} "
+                f"от {time.strftime('%d.%m.%Y %H:%M', time.localtime(saved_at))}. Восстановить?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                remove_autosave(path)  # Копия удаляется, только если пользователь от нее отказался
+                lock.unlock()
+                continue
+            if len(self.graphs) == 0 and self.load_project(path):
+                # Данные отображены из файла автосохранения, поэтому он удаляется только при выходе
+                self.recovered_autosaves.append((lock, path))
+                self.project_name = project_name
+                self.project_journal = None  # Первое сохранение перепишет проект целиком
+                IS_SAVE = False
+                continue
+            # Уже восстановлен другой проект или файл не открылся: копия остается на диске
+            lock.unlock()
+            reason = "уже открыт другой проект" if len(self.graphs) else "файл не удалось открыть"
+            QMessageBox.information(
+                self,
+                "Восстановление проекта",
+                f"Автосохранение не восстановлено ({reason}). Файл сохранен: {path}\n"
+                "Его можно открыть через \"Открыть проект\", при следующем запуске он будет предложен снова."
+            )
+
     def set_the_scale_1_1(self):
         try:
             self.scale_x_min = float(self.x_min_input.text())
@@ -337,8 +989,7 @@ class MainWindow(QMainWindow):
             for i in self.graphs:
                 if not i.scalable:
                     continue
-                i.graph_window.plot_widget.setXRange(self.scale_x_min, self.scale_x_max)
-                i.graph_window.plot_widget.setYRange(self.scale_y_min, self.scale_y_max)
+                self.set_graph_range(i, x_range=(self.scale_x_min, self.scale_x_max), y_range=(self.scale_y_min, self.scale_y_max))
                 # Установить диапазон для каждого из графиков
                 i.scale_x_min = self.scale_x_min
                 i.scale_x_max = self.scale_x_max
@@ -359,8 +1010,7 @@ class MainWindow(QMainWindow):
             for i in self.graphs:
                 if not i.scalable:
                     continue
-                i.graph_window.plot_widget.setXRange(self.scale_x_min, self.scale_x_max)
-                i.graph_window.plot_widget.setYRange(self.scale_y_min, self.scale_y_max)
+                self.set_graph_range(i, x_range=(self.scale_x_min, self.scale_x_max), y_range=(self.scale_y_min, self.scale_y_max))
                 # Установить диапазон для каждого из графиков
                 i.scale_y_min = self.scale_y_min
                 i.scale_y_max = self.scale_y_max
@@ -379,7 +1029,7 @@ class MainWindow(QMainWindow):
             x_max = float(self.x1_max_input.text())
             self.graphs[self.current_grapth_index].scale_x_min = x_min
             self.graphs[self.current_grapth_index].scale_x_max = x_max
-            self.graphs[self.current_grapth_index].graph_window.plot_widget.setXRange(x_min, x_max)
+            self.set_graph_range(self.graphs[self.current_grapth_index], x_range=(x_min, x_max))
         except ValueError:
             pass
 
@@ -389,7 +1039,7 @@ class MainWindow(QMainWindow):
             y_max = float(self.y1_max_input.text())
             self.graphs[self.current_grapth_index].scale_y_min = y_min
             self.graphs[self.current_grapth_index].scale_y_max = y_max
-            self.graphs[self.current_grapth_index].graph_window.plot_widget.setYRange(y_min, y_max)
+            self.set_graph_range(self.graphs[self.current_grapth_index], y_range=(y_min, y_max))
         except ValueError:
             pass
 
@@ -399,21 +1049,74 @@ class MainWindow(QMainWindow):
         for i in self.graphs:
             if not i.scalable:
                 continue
-            filtered_data = i.data.loc[x_min:x_max]
-            y_min = filtered_data.min().min()
-            y_max = filtered_data.max().max()
-            i.graph_window.plot_widget.setYRange(y_min, y_max)
+            if i.show:
+                self.memory.touch(i)
+            # Скрытые и выгруженные графики не загружаются в RAM: диапазон считается по отображенным массивам
+            y_range = i.visible_y_range(x_min, x_max)
+            if y_range is None:
+                continue  # В диапазоне нет точек
+            i.scale_y_min, i.scale_y_max = y_range
+            self.set_graph_range(i, y_range=(i.scale_y_min, i.scale_y_max))
         self.rewrite_scale()
 
     def set_y_scale1(self):
         x_min = self.graphs[self.current_grapth_index].scale_x_min
         x_max = self.graphs[self.current_grapth_index].scale_x_max
-        filtered_data = self.graphs[self.current_grapth_index].data.loc[x_min:x_max]
-        y_min = filtered_data.min().min()
-        y_max = filtered_data.max().max()
-        self.graphs[self.current_grapth_index].graph_window.plot_widget.setYRange(y_min, y_max)
+        if self.graphs[self.current_grapth_index].show:
+            self.memory.touch(self.graphs[self.current_grapth_index])
+        y_range = self.graphs[self.current_grapth_index].visible_y_range(x_min, x_max)
+        if y_range is None:
+            return  # В диапазоне нет точек
+        y_min, y_max = y_range
+        self.graphs[self.current_grapth_index].scale_y_min = y_min
+        self.graphs[self.current_grapth_index].scale_y_max = y_max
+        self.set_graph_range(self.graphs[self.current_grapth_index], y_range=(y_min, y_max))
         # self.rewrite_scale()
 
+    def set_graph_range(self, graph_data, x_range=None, y_range=None, padding=None):
+        """
+        Изменение диапазона осей в окне графика. Окна скрытых графиков создаются только при первом
+        показе, тогда масштаб берется из полей scale_* в GraphData.
+        Диапазон применяется не сразу: изменения всех окон копятся и применяются таймером не чаще
+        раза за RANGE_UPDATE_INTERVAL, по одному setRange (одной перерисовке) на окно. Скрытые окна
+        получают последний диапазон при показе.
+        """
+        if graph_data.graph_id not in self.views:
+            return
+        pending = self.pending_ranges.setdefault(graph_data.graph_id, [graph_data, None, None, None])
+        if x_range is not None:
+            pending[1] = tuple(x_range)
+        if y_range is not None:
+            pending[2] = tuple(y_range)
+        pending[3] = padding
+        if not self.range_timer.isActive():
+            self.range_timer.start()
+
+    def apply_pending_ranges(self, graph_ids=None):
+        """Применить накопленные диапазоны видимых окон (или только окон графиков graph_ids)"""
+        self.applying_ranges = True  # Изменения от самих setRange не должны снова расходиться по связанным осям
+        try:
+            for graph_id in list(self.pending_ranges) if graph_ids is None else graph_ids:
+                if graph_id not in self.pending_ranges:
+                    continue
+                _, x_range, y_range, padding = self.pending_ranges[graph_id]
+                view = self.views.get(graph_id)
+                if view is not None and not view.window.isVisible():
+                    continue  # Скрытое окно: диапазон применится при показе
+                del self.pending_ranges[graph_id]
+                if view is not None:
+                    view.field.getViewBox().setRange(xRange=x_range, yRange=y_range, padding=padding)
+        finally:
+            self.applying_ranges = False
+
+    def on_x_range_changed(self, graph_data, x_range):
+        """Диапазон X окна изменился (в том числе мышью): при связанных осях он переносится на остальные окна"""
+        if not LINK_X_AXES or self.applying_ranges or not graph_data.scalable:
+            return
+        for other in self.graphs:
+            if other is not graph_data and other.scalable:
+                self.set_graph_range(other, x_range=x_range, padding=0)
+
     def rewrite_scale(self):
         """Обновление виджетов диапазона X и Y на основе текущих значений масштабов."""
         # Установка значений масштаба оси X
@@ -443,8 +1146,7 @@ class MainWindow(QMainWindow):
             for i in self.graphs:
                 if not i.scalable:
                     continue
-                i.graph_window.plot_widget.setXRange(self.scale_x_min, self.scale_x_max)
-                i.graph_window.plot_widget.setYRange(self.scale_y_min, self.scale_y_max)
+                self.set_graph_range(i, x_range=(self.scale_x_min, self.scale_x_max), y_range=(self.scale_y_min, self.scale_y_max))
                 # Установить диапазон для каждого из графиков
                 i.scale_x_min = self.scale_x_min
                 i.scale_x_max = self.scale_x_max
@@ -464,30 +1166,20 @@ class MainWindow(QMainWindow):
     def set_default_scale(self):  # Функция-обработчик для кнопки "Сбросить"
         if len(self.graphs) == 0:
             return
-        x_min = self.graphs[0].data.index.min()
-        x_max = self.graphs[0].data.index.max()
-        y_min = self.graphs[0].data.min().min()
-        y_max = self.graphs[0].data.max().max()
+        x_min, x_max, y_min, y_max = self.graphs[0].bounds() or (np.inf, -np.inf, np.inf, -np.inf)
         for i in self.graphs:
             if not i.scalable:
                 continue
-            i.scale_x_min = i.data.index.min()  # Минимум значений индекса "T"
-            i.scale_x_max = i.data.index.max()  # Максимум значений индекса "T"
-            i.scale_y_min = i.data.min().min()  # Минимум значений во всех столбцах
-            i.scale_y_max = i.data.max().max()  # Максимум значений во всех столбцах
+            bounds = i.bounds()  # По статистике столбцов, данные не читаются
+            if bounds is None:
+                continue  # Пустой график
+            # Минимум и максимум значений индекса "T" и значений во всех столбцах
+            i.scale_x_min, i.scale_x_max, i.scale_y_min, i.scale_y_max = bounds
             x_min = min(x_min, i.scale_x_min)
             x_max = max(x_max, i.scale_x_max)
             y_min = min(y_min, i.scale_y_min)
             y_max = max(y_max, i.scale_y_max)
-            i.graph_window.plot_widget.setXRange(i.scale_x_min, i.scale_x_max)
-            i.graph_window.plot_widget.setYRange(i.scale_y_min, i.scale_y_max)
-        # Если есть окно настройки текущего графика:
-        if self.current_grapth_index is not None:
-            if self.graphs[self.current_grapth_index].scalable:
-                self.graphs[self.current_grapth_index].scale_x_min = self.graphs[self.current_grapth_index].data.index.min()
-                self.graphs[self.current_grapth_index].scale_x_max = self.graphs[self.current_grapth_index].data.index.max()
-                self.graphs[self.current_grapth_index].scale_y_min = self.graphs[self.current_grapth_index].data.iloc[:, self.current_grapth_index].min()
-                self.graphs[self.current_grapth_index].scale_y_max = self.graphs[self.current_grapth_index].data.iloc[:, self.current_grapth_index].max()
+            self.set_graph_range(i, x_range=(i.scale_x_min, i.scale_x_max), y_range=(i.scale_y_min, i.scale_y_max))
         # Изменим общий масштаб
         self.scale_x_min = x_min
         self.scale_x_max = x_max
@@ -506,24 +1198,22 @@ class MainWindow(QMainWindow):
             self.graphs[self.current_grapth_index].scale_x_max = x_max
             self.graphs[self.current_grapth_index].scale_y_min = y_min
             self.graphs[self.current_grapth_index].scale_y_max = y_max
-            self.graphs[self.current_grapth_index].graph_window.plot_widget.setXRange(x_min, x_max)
-            self.graphs[self.current_grapth_index].graph_window.plot_widget.setYRange(y_min, y_max)
+            self.set_graph_range(self.graphs[self.current_grapth_index], x_range=(x_min, x_max), y_range=(y_min, y_max))
         except ValueError:
             pass
 
     def reset_the_scale(self):
         """ Сбросить масштаб выбранного графика """
         if self.current_grapth_index is not None:
-            x_min = self.graphs[self.current_grapth_index].data.index.min()
-            x_max = self.graphs[self.current_grapth_index].data.index.max()
-            y_min = self.graphs[self.current_grapth_index].data.min().min()
-            y_max = self.graphs[self.current_grapth_index].data.max().max()
+            bounds = self.graphs[self.current_grapth_index].bounds()
+            if bounds is None:
+                return  # Пустой график
+            x_min, x_max, y_min, y_max = bounds
             self.graphs[self.current_grapth_index].scale_x_min = x_min  # Минимум значений индекса "T"
             self.graphs[self.current_grapth_index].scale_x_max = x_max  # Максимум значений индекса "T"
             self.graphs[self.current_grapth_index].scale_y_min = y_min  # Минимум значений во всех столбцах
             self.graphs[self.current_grapth_index].scale_y_max = y_max  # Максимум значений во всех столбцах
-            self.graphs[self.current_grapth_index].graph_window.plot_widget.setXRange(x_min, x_max)
-            self.graphs[self.current_grapth_index].graph_window.plot_widget.setYRange(y_min, y_max)
+            self.set_graph_range(self.graphs[self.current_grapth_index], x_range=(x_min, x_max), y_range=(y_min, y_max))
             self.x1_min_input.setText(str(x_min))  # Устанавливаем значение минимума оси X
             self.x1_max_input.setText(str(x_max))  # Устанавливаем значение максимума оси X
             self.y1_min_input.setText(str(y_min))  # Устанавливаем значение минимума оси Y
@@ -560,14 +1250,135 @@ class MainWindow(QMainWindow):
         save_graph_action = QAction("Экспортировать текущий график в png", self)
         save_graph_action.triggered.connect(self.screen_save_img)
         graph_menu.addAction(save_graph_action)
+        float32_action = QAction("Хранить данные в float32 (вдвое меньше памяти)", self)
+        float32_action.setCheckable(True)
+        float32_action.setChecked(STORAGE_DTYPE == np.float32)
+        float32_action.toggled.connect(self.set_float32_storage)
+        graph_menu.addAction(float32_action)
+        batch_action = QAction("Рисовать кривые одного цвета одним элементом", self)
+        batch_action.setCheckable(True)
+        batch_action.setChecked(BATCH_CURVES)
+        batch_action.toggled.connect(self.set_batch_curves)
+        graph_menu.addAction(batch_action)
+        link_action = QAction("Связать оси X масштабируемых графиков", self)
+        link_action.setCheckable(True)
+        link_action.setChecked(LINK_X_AXES)
+        link_action.toggled.connect(self.set_link_x_axes)
+        graph_menu.addAction(link_action)
+        watch_fps_action = QAction("Частота обновления дописываемых файлов", self)
+        watch_fps_action.triggered.connect(self.set_watch_fps)
+        graph_menu.addAction(watch_fps_action)
+        self.stream_action = QAction("Принимать строки от расчетов (локальный сокет)", self)
+        self.stream_action.setCheckable(True)
+        self.stream_action.setChecked(STREAM_SERVER)
+        self.stream_action.toggled.connect(self.set_stream_server)
+        graph_menu.addAction(self.stream_action)
 
         window_menu = menu_bar.addMenu("Окна")
+        grid_action = QAction("Все графики в одном окне (сетка)", self)
+        grid_action.setCheckable(True)
+        grid_action.setChecked(GRID_MODE)
+        grid_action.toggled.connect(self.set_grid_mode)
+        window_menu.addAction(grid_action)
         new_window_action = QAction("Сделать одного размера", self)
         new_window_action.triggered.connect(self.win_as_one)
         window_menu.addAction(new_window_action)
+        memory_budget_action = QAction("Лимит памяти для данных", self)
+        memory_budget_action.triggered.connect(self.set_memory_budget)
+        window_menu.addAction(memory_budget_action)
+        memory_stats_action = QAction("Статистика памяти", self)
+        memory_stats_action.triggered.connect(self.show_memory_stats)
+        window_menu.addAction(memory_stats_action)
+
+    def set_float32_storage(self, enabled):
+        """
+        Режим хранения значений графиков в float32: точности хватает для отображения, а памяти
+        и места в проекте нужно вдвое меньше. Сразу переводятся только показанные графики, данные
+        которых уже в RAM; отображенные из файла и выгруженные графики переводятся при следующем
+        показе (show_graph), чтобы переключение не загружало в память весь проект.
+        """
+        global STORAGE_DTYPE
+        STORAGE_DTYPE = np.float32 if enabled else np.float64
+        for graph_data in self.graphs:
+            shown = graph_data.show and graph_data.graph_id in self.views
+            if not shown or (not graph_data.growing and array_is_mapped(graph_data.values)):
+                self.pending_dtype.add(graph_data.graph_id)
+                continue
+            self.pending_dtype.discard(graph_data.graph_id)
+            graph_data.set_dtype(STORAGE_DTYPE)
+            self.rewrite_graph(graph_data)  # Кривые окна держат ссылки на старый блок данных
+        self.memory.enforce()
+
+    def apply_pending_dtype(self, graph_data):
+        """Перевести график в STORAGE_DTYPE, если он не был переведен при переключении float32. True, если переведен"""
+        if graph_data.graph_id not in self.pending_dtype:
+            return False
+        self.pending_dtype.discard(graph_data.graph_id)
+        self.memory.touch(graph_data)
+        graph_data.set_dtype(STORAGE_DTYPE)
+        return True
+
+    def set_grid_mode(self, enabled):
+        """Переключение между отдельными окнами графиков и общей сеткой в главном окне"""
+        global GRID_MODE
+        for graph_data in self.graphs:
+            self.release_graph_window(graph_data)
+        GRID_MODE = enabled
+        self.graph_grid.setVisible(enabled)
+        for graph_data in self.graphs:
+            if graph_data.show:
+                self.show_graph(graph_data)
+
+    def set_link_x_axes(self, enabled):
+        """Связь осей X окон масштабируемых графиков"""
+        global LINK_X_AXES
+        LINK_X_AXES = enabled
+
+    def set_batch_curves(self, enabled):
+        """Режим объединения кривых одного стиля для открытых и новых окон"""
+        global BATCH_CURVES
+        BATCH_CURVES = enabled
+        for view in self.views.values():
+            view.curves.set_batch(enabled)
+
+    def set_watch_fps(self):
+        global WATCH_FPS
+        fps, ok = QInputDialog.getInt(
+            self, "Слежение за файлами", "Сколько раз в секунду дочитывать дописываемые CSV:", WATCH_FPS, 1, 60
+        )
+        if ok:
+            WATCH_FPS = fps
+            self.watch_timer.setInterval(1000 // WATCH_FPS)
+
+    def set_memory_budget(self):
+        budget, ok = QInputDialog.getInt(
+            self, "Лимит памяти", "Сколько МБ данных графиков держать в памяти:",
+            self.memory.budget // 1024 ** 2, 64, 1024 * 1024
+        )
+        if ok:
+            self.memory.budget = budget * 1024 ** 2
+            self.memory.enforce()
+
+    def show_memory_stats(self):
+        QMessageBox.information(
+            self,
+            "Статистика памяти",
+            f"Лимит: {self.memory.budget // 1024 ** 2} МБ\n"
+            f"Данные в памяти: {self.memory.resident_size() // 1024 ** 2} МБ\n"
+            f"Выгружено на диск графиков: {len(self.memory.spilled) - len(self.memory.reloaded)}\n"
+            f"Выгрузок: {self.memory.evictions}\n"
+            f"Загрузок обратно: {self.memory.reloads}"
+        )
+
+    def release_graph_window(self, graph_data):
+        """Удаляет скрытое окно графика, чтобы его кривые не держали данные; при показе окно создастся заново"""
+        view = self.views.pop(graph_data.graph_id, None)
+        if view is None:
+            return
+        view.window.deleteLater()
+        self.pending_ranges.pop(graph_data.graph_id, None)  # Новое окно возьмет масштаб из scale_*
 
     def save_as(self):
-        global IS_SAVE
         if len(self.graphs) == 0:
             return
 
@@ -587,41 +1398,63 @@ class MainWindow(QMainWindow):
         if not file_path.endswith(".sgr"):
             file_path += ".sgr"
 
-        # Сохраняем список self.graphs в файл
-        try:
-            with open(file_path, "wb") as file:
-                pickle.dump(self.graphs, file)
-            # QMessageBox.information(self, "Успех", f"Файл успешно сохранен: {file_path}")
+        if self.save_to(file_path):
             self.project_name = file_path
-            IS_SAVE = True
-        except Exception as e:
-            # Попытка удаления файла, если он был создан
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except OSError as remove_error:
-                    QMessageBox.warning(
-                        self,
-                        "Предупреждение",
-                        f"Не удалось удалить файл после ошибки: {remove_error}"
-                    )
-            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить файл: {e}")
 
     def save(self):
-        global IS_SAVE
         if self.project_name is None:
             self.save_as()
             return
+        self.save_to(self.project_name)
+
+    def save_to(self, file_path):
+        """
+        Сохранение проекта. Если файл уже открыт как двоичный проект .sgr, изменения дописываются в его журнал,
+        иначе (и когда журнал пора сжать) проект целиком переписывается через временный файл.
+        Возвращает True при успехе.
+        """
+        global IS_SAVE
+        if self.autosave_thread is not None:
+            self.autosave_thread.join()  # Не пишем проект одновременно с чтением данных автосохранением
+        if (file_path == self.project_name and self.project_journal is not None
+                and not project_needs_compaction(file_path, self.graphs, self.project_journal)):
+            try:
+                self.project_journal = append_project_changes(file_path, self.graphs, self.project_journal)
+                # Новые блоки данных тоже читаются из файла; заголовок и журнал заново не разбираются
+                mapped = map_project_arrays(file_path, self.project_journal['written'])
+                for graph_data in self.graphs:
+                    if graph_data.graph_id in mapped:
+                        graph_data.swap_data(mapped[graph_data.graph_id])
+                    graph_data.dirty_fields.clear()
+                IS_SAVE = True
+                self.discard_autosave()
+                return True
+            except Exception as e:
+                QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить файл: {e}")
+                return False
+
         # Создаем временное имя файла
-        temp_file_path = self.project_name + ".tmp"
+        temp_file_path = file_path + ".tmp"
         try:
             # Сохраняем данные во временный файл
             with open(temp_file_path, "wb") as temp_file:
-                pickle.dump(self.graphs, temp_file)
+                write_project(temp_file, self.graphs)
             # Заменяем старый файл временным
-            os.replace(temp_file_path, self.project_name)
+            try:
+                os.replace(temp_file_path, file_path)
+            except PermissionError:
+                # Windows не дает заменить файл, пока он отображен в память
+                self.detach_project_data()
+                os.replace(temp_file_path, file_path)
+            # Дальше данные читаются из сохраненного файла, а не держатся в памяти
+            saved_graphs, self.project_journal = read_project(file_path)
+            for graph_data, saved_graph in zip(self.graphs, saved_graphs):
+                graph_data.swap_data(saved_graph.data_arrays())
+                graph_data.dirty_fields.clear()
             IS_SAVE = True
-            # QMessageBox.information(self, "Успех", f"Файл успешно сохранен: {self.project_name}")
+            self.discard_autosave()
+            # QMessageBox.information(self, "Успех", f"Файл успешно сохранен: {file_path}")
+            return True
         except Exception as e:
             # Удаляем временный файл, если произошла ошибка
             if os.path.exists(temp_file_path):
@@ -634,10 +1467,17 @@ class MainWindow(QMainWindow):
                         f"Не удалось удалить временный файл: {remove_error}"
                     )
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить файл: {e}")
+            return False
+
+    def detach_project_data(self):
+        """Копирует отображенные в память данные в RAM и перерисовывает окна, чтобы освободить файл проекта"""
+        for graph_data in self.graphs:
+            graph_data.swap_data({name: np.array(array) for name, array in graph_data.data_arrays().items()})
+            self.rewrite_graph(graph_data)
+        gc.collect()
 
     def open(self):
         """Открыть файл и загрузить список графиков в self.graphs"""
-        global IS_SAVE
         # !!! восстановить 2 объекта - таблицы и полотно графиков!
         if len(self.graphs) > 0:
             response = QMessageBox.question(
@@ -658,25 +1498,41 @@ class MainWindow(QMainWindow):
         # Если пользователь отменил выбор, выходим
         if not file_path:
             return
+        self.load_project(file_path)
+
+    def load_project(self, file_path):
+        """Загрузка проекта из файла. Возвращает True при успехе"""
+        global IS_SAVE
         try:
-            # Открываем файл и загружаем данные
-            with open(file_path, "rb") as file:
-                loaded_graphs = pickle.load(file)
-            # Проверяем, что данные корректны
-            if not isinstance(loaded_graphs, list):
-                raise ValueError("Некорректный формат данных в файле.")
+            # Открываем файл и загружаем данные (старый формат pickle или двоичный .sgr)
+            loaded_graphs, journal = read_project(file_path)
+            # Окна прежнего проекта удаляются: id графиков хранятся в проекте, и повторно открытый
+            # проект иначе получил бы старые окна, привязанные к прежним GraphData
+            for graph_data in self.graphs:
+                view = self.views.get(graph_data.graph_id)
+                if view is not None:
+                    view.window.hide()  # Не close: closeEvent снял бы show у графика прежнего проекта
+                    self.release_graph_window(graph_data)
             # Обновляем список self.graphs
+            self.memory.clear()
+            self.pending_dtype.clear()
+            self.watched.clear()  # Графики прежнего проекта больше не отслеживаются
+            self.watch_timer.stop()
+            for session in self.streams:
+                self.detach_stream(session)
             self.graphs = loaded_graphs
+            self.graph_list.set_graphs(self.graphs)
+            self.species_index.clear()
+            for graph_data in self.graphs:
+                self.species_index.add(graph_data)
             self.project_name = file_path
-            # Выполняем действия для обновления интерфейса
-            # self.update_graph_table()  # Пример: метод обновления таблицы графиков
-            self.rewrite_table()
+            self.project_journal = journal  # None для старого формата: первое сохранение перепишет файл
+            # Окна скрытых графиков не создаются, пока их не покажут (toggle_graph_visibility)
             for i in self.graphs:
                 if i.show is True:
                     self.show_graph(i)
                 else:
-                    self.show_graph(i)
-                    i.graph_window.hide()
+                    self.memory.touch(i)
             # Обновление глобальных переменных для общего диапазона масштабирования
             self.scale_x_min = min(obj.scale_x_min for obj in self.graphs)
             self.scale_x_max = max(obj.scale_x_max for obj in self.graphs)
@@ -685,31 +1541,43 @@ class MainWindow(QMainWindow):
             self.rewrite_scale()  # Скорректируем отображаемый диапазон масштаба графиков
         except (pickle.UnpicklingError, ValueError) as e:
             QMessageBox.critical(self, "Ошибка", f"Файл поврежден или имеет неверный формат: {e}")
+            return False
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось открыть файл: {e}")
-        IS_SAVE = True
+            return False
+        finally:
+            IS_SAVE = True
+        return True
 
     def win_as_one(self):
         """ Делаем все окна размером как выбранное """
         if self.current_grapth_index is None:
             QMessageBox.critical(self, "График не выбран", f"Выберите в таблице справа график, размер окна которого получат остальные окна")
             return
-        current_size = self.graphs[self.current_grapth_index].graph_window.plot_widget.size()
-        for i in self.graphs:
-            i.graph_window.plot_widget.resize(current_size.width(), current_size.height())
+        current_view = self.views.get(self.graphs[self.current_grapth_index].graph_id)
+        if current_view is None:
+            QMessageBox.critical(self, "Окно не открыто", "Окно выбранного графика еще не открывалось, покажите его")
+            return
+        if GRID_MODE:
+            return  # Ячейки сетки и так одного размера
+        current_size = current_view.field.size()
+        for view in self.views.values():
+            view.field.resize(current_size.width(), current_size.height())
 
     def setup_table(self):
         """Настройка таблицы"""
-        self.table.setColumnCount(4)  # Увеличиваем количество столбцов до 4
-        self.table.setHorizontalHeaderLabels(
-            ["График", "Показать", "Масштаб", "Удалить"])
+        self.graph_list = GraphListModel(self.graphs, self.table)
+        self.graph_list.visibility_toggled.connect(self.toggle_graph_visibility)
+        self.table.setModel(self.graph_list)
+        self.table.clicked.connect(self.on_table_clicked)
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
         self.table.setColumnWidth(1, 80)
         self.table.setColumnWidth(2, 80)
         self.table.setColumnWidth(3, 50)  # Устанавливаем ширину столбца для кнопки
         self.table.verticalHeader().setVisible(False)  # Отключаем нумерацию строк
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         # Подключаем сигнал выбора элемента к обработчику
-        self.table.itemSelectionChanged.connect(self.on_graph_selected)
+        self.table.selectionModel().selectionChanged.connect(lambda *args: self.on_graph_selected())
         # self.table.selectionModel().selectionChanged.connect(
         #     lambda selected, deselected: self.on_selection_changed_1(selected, deselected, table_widget, graph_data,
         #                                                            plot_widget)
@@ -724,12 +1592,13 @@ class MainWindow(QMainWindow):
             self.current_grapth_index = row_index
             # print(f"Выбран индекс графика: {row_index}")
             self.container_widget.setVisible(True)  # Показываем форму
-            self.current_graph_name_label.setText(self.table.item(row_index, 0).text())  # Установка текста в QLabel
+            self.current_graph_name_label.setText(self.graphs[row_index].file_name)  # Установка текста в QLabel
             # Установка значений в QLineEdit
             self.x1_min_input.setText(str(self.graphs[row_index].scale_x_min))  # Устанавливаем значение минимума оси X
             self.x1_max_input.setText(str(self.graphs[row_index].scale_x_max))  # Устанавливаем значение максимума оси X
             self.y1_min_input.setText(str(self.graphs[row_index].scale_y_min))  # Устанавливаем значение минимума оси Y
             self.y1_max_input.setText(str(self.graphs[row_index].scale_y_max))  # Устанавливаем значение максимума оси Y
+            self.sync_watch_button()
         else:
             # Если не выбран ни один график
             self.container_widget.setVisible(False)  # Показываем форму
@@ -742,212 +1611,404 @@ class MainWindow(QMainWindow):
             # Теперь можно выполнить нужные действия с row_index или graph_name
 
     def add_graph(self):
-        """Добавление нового графика"""
-        file_path, _ = QFileDialog.getOpenFileName(self, "Выберите CSV файл", "", "CSV Files (*.csv)")
-        if not file_path:
+        """Добавление новых графиков (можно выбрать несколько файлов)"""
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Выберите CSV файлы", "", "CSV Files (*.csv)")
+        if not file_paths:
             return  # Если файл не выбран, выйти
 
-        # Чтение данных из CSV
-        data = pd.read_csv(file_path, index_col=0)
-        data = data.fillna(0)  # Меняем НаН на 0
-
-        # Создание структуры данных для графика
-        graph_data = GraphData(data, file_path)
-        self.graphs.append(graph_data)
-
-        graph_data.graphics_visible = [True] * len(data.columns)
-
-        # Установка значений для scale_x_min и scale_x_max из индекса
-        graph_data.scale_x_min = data.index.min()  # Минимум значений индекса "T"
-        graph_data.scale_x_max = data.index.max()  # Максимум значений индекса "T"
-
-        # Установка значений для scale_y_min и scale_y_max из всех столбцов
-        graph_data.scale_y_min = data.min().min()  # Минимум значений во всех столбцах
-        graph_data.scale_y_max = data.max().max()  # Максимум значений во всех столбцах
+        # Чтение данных из CSV идет в фоновом потоке, графики добавятся по окончании
+        if len(file_paths) == 1:
+            loader = BackgroundLoader(
+                CsvLoadWorker(file_paths[0]), f"Загрузка {os.path.basename(file_paths[0])}...", self)
+            loader.loaded.connect(self.attach_graph)
+        else:
+            loader = BackgroundLoader(
+                BatchLoadWorker(file_paths), f"Загрузка файлов: {len(file_paths)}...", self)
+            loader.loaded.connect(self.on_batch_loaded)
+        loader.failed.connect(self.on_load_failed)
+        loader.done.connect(lambda: self.loaders.remove(loader))
+        self.loaders.append(loader)
+        loader.start()
+
+    def on_load_failed(self, message):
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить файл: {message}")
+
+    def on_batch_loaded(self, result):
+        graphs, errors = result
+        self.attach_graphs(graphs)
+        if errors:
+            QMessageBox.warning(self, "Ошибка", "Не удалось загрузить файлы:\n" + "\n".join(errors))
+
+    def attach_graph(self, graph_data):
+        """Добавление загруженного графика в проект, окно и таблицу"""
+        self.attach_graphs([graph_data])
+
+    def attach_graphs(self, graphs):
+        """Добавление пачки графиков: один пересчет масштаба и одна вставка строк в таблицу на всю пачку"""
+        if not graphs:
+            return
+        for graph_data in graphs:
+            graph_data.set_dtype(STORAGE_DTYPE)  # Загрузчики всегда читают float64
+        self.graph_list.append(graphs)
+        for graph_data in graphs:
+            self.species_index.add(graph_data)
 
         # Обновление глобальных переменных для общего диапазона масштабирования
-        self.scale_x_min = min(self.scale_x_min, graph_data.scale_x_min)
-        self.scale_x_max = max(self.scale_x_max, graph_data.scale_x_max)
-        self.scale_y_min = min(self.scale_y_min, graph_data.scale_y_min)
-        self.scale_y_max = max(self.scale_y_max, graph_data.scale_y_max)
+        self.scale_x_min = min(self.scale_x_min, min(g.scale_x_min for g in graphs))
+        self.scale_x_max = max(self.scale_x_max, max(g.scale_x_max for g in graphs))
+        self.scale_y_min = min(self.scale_y_min, min(g.scale_y_min for g in graphs))
+        self.scale_y_max = max(self.scale_y_max, max(g.scale_y_max for g in graphs))
 
         self.rewrite_scale()  # Скорректируем отображаемый диапазон масштаба графиков
 
-        # Отображение графика в новом окне
-        self.show_graph(graph_data)
-
-        # Добавление строки в таблицу
-        row_position = self.table.rowCount()
-        self.table.insertRow(row_position)
-        self.table.setItem(row_position, 0, QTableWidgetItem(graph_data.file_name))
-
-        # Создание чекбоксов для отображения и масштабирования
-        show_checkbox = QCheckBox()
-        show_checkbox.setChecked(True)
-        show_checkbox.stateChanged.connect(
-            lambda state, g=graph_data, r=row_position: self.toggle_graph_visibility(g, state, r))
-        self.table.setCellWidget(row_position, 1, show_checkbox)
-
-        scale_checkbox = QCheckBox()
-        scale_checkbox.setChecked(graph_data.scalable)
-        scale_checkbox.stateChanged.connect(
-            lambda state, g=graph_data, r=row_position: self.toggle_graph_scaleble(g, state, r))
-        self.table.setCellWidget(row_position, 2, scale_checkbox)
-
-        # Создаем чекбокс удаления
-        delete_checkbox = QCheckBox()
-        delete_checkbox.setStyleSheet("""
-            QCheckBox::indicator {
-                width: 14px;
-                height: 14px;
-                border-radius: 7px;
-                background-color: red;
-            }
-            QCheckBox::indicator:checked {
-                background-color: darkred;
-            }
-        """)
-        # Обработка клика по чекбоксу для удаления графика
-        delete_checkbox.stateChanged.connect(lambda state, row=row_position, g=graph_data: self.delete_graph(row, g))
-        # Размещаем чекбокс в ячейке таблицы
-        self.table.setCellWidget(row_position, 3, delete_checkbox)
-
-    def rewrite_table(self):
-        """Пересоздает таблицу self.table на основе данных из self.graphs."""
-        # Очищаем таблицу
-        self.table.setRowCount(0)
-
-        # Добавляем строки для каждого графика в списке self.graphs
-        for row_position, graph_data in enumerate(self.graphs):
-            self.table.insertRow(row_position)
-            self.table.setItem(row_position, 0, QTableWidgetItem(graph_data.file_name))
-
-            # Создание чекбоксов для отображения и масштабирования с учётом состояния в GraphData
-            show_checkbox = QCheckBox()
-            show_checkbox.setChecked(graph_data.show)
-            show_checkbox.stateChanged.connect(
-                lambda state, g=graph_data, r=row_position: self.toggle_graph_visibility(g, state, r))
-            self.table.setCellWidget(row_position, 1, show_checkbox)
-
-            scale_checkbox = QCheckBox()
-            scale_checkbox.setChecked(graph_data.scalable)
-            scale_checkbox.stateChanged.connect(
-                lambda state, g=graph_data, r=row_position: self.toggle_graph_scaleble(g, state, r))
-            self.table.setCellWidget(row_position, 2, scale_checkbox)
-
-            # Создаем чекбокс удаления
-            delete_checkbox = QCheckBox()
-            delete_checkbox.setStyleSheet("""
-                QCheckBox::indicator {
-                    width: 14px;
-                    height: 14px;
-                    border-radius: 7px;
-                    background-color: red;
-                }
-                QCheckBox::indicator:checked {
-                    background-color: darkred;
-                }
-            """)
-            # Обработка клика по чекбоксу для удаления графика
-            delete_checkbox.stateChanged.connect(
-                lambda state, row=row_position, g=graph_data: self.delete_graph(row, g))
-            self.table.setCellWidget(row_position, 3, delete_checkbox)
-
-    def delete_graph(self, row_position, graph_data):
+        # Отображение графиков в новых окнах
+        for graph_data in graphs:
+            self.show_graph(graph_data)  # Заодно регистрирует данные в менеджере памяти
+
+    def on_table_clicked(self, index):
+        """Щелчок по столбцу "Удалить" таблицы графиков"""
+        if index.column() == 3:
+            self.delete_graph(self.graphs[index.row()])
+
+    def delete_graph(self, graph_data):
         """Удаление графика"""
         # Закрываем окно графика, если оно открыто
-        if graph_data.graph_window:  # and graph_data.graph_window.isVisible()
-            graph_data.graph_window.close()
+        view = self.views.get(graph_data.graph_id)
+        if view is not None:
+            view.window.close()
+            self.release_graph_window(graph_data)  # Окно (или ячейка сетки) больше не понадобится
 
         # Удаляем объект графика из списка
-        self.graphs.remove(graph_data)
-        self.rewrite_table()
-
-        # Если удаляемый график был выбран текущим
-        if row_position == self.current_grapth_index:
-            self.container_widget.setVisible(False)  # Показываем форму
-            self.current_grapth_index = None
-
-    def toggle_all_graphs_visibility(self, state, graph_data, table_widget):
-        """Изменение видимости всех графиков"""
-        state = Qt.CheckState(state)
-        is_visible = state == Qt.Checked
-        for i in range(len(graph_data.graphics_visible)):
-            graph_data.graphics_visible[i] = is_visible
-            # Обновляем состояние отдельных чекбоксов
-            checkbox = table_widget.cellWidget(i + 1, 0)  # Пропускаем первый общий чекбокс
-            checkbox.setChecked(is_visible)
-        self.rewrite_graph(graph_data)
-
-    def toggle_individual_graph_visibility(self, state, idx, graph_data, plot_widget):
-        """Изменение видимости отдельного графика"""
-        state = Qt.CheckState(state)
-        is_visible = state == Qt.Checked
-        graph_data.graphics_visible[idx] = is_visible
-        # print('state=', state, 'idx=', idx, 'plot_widget.plotItem.items=', plot_widget.plotItem.items)
-        # self.on_selection_changed(0, 0,    )jjj
-        # Получаем график для соответствующего соединения и устанавливаем его видимость
-        plot = plot_widget.plotItem.items[idx]  # !!!! Здесь ошибка - индекс вне диапазона (0)!!!
-        plot.setVisible(is_visible)
-        self.rewrite_graph(graph_data)
+        self.graph_list.remove(graph_data)
+        self.species_index.remove(graph_data)
+        self.pending_ranges.pop(graph_data.graph_id, None)
+        self.set_watch(graph_data, False)
+        for session in self.streams:
+            if session.graph_data is graph_data:
+                self.detach_stream(session)
+        self.memory.forget(graph_data)
+        self.pending_dtype.discard(graph_data.graph_id)
+        # Строки ниже удаленной сдвинулись: номер выбранного графика берется заново
+        self.on_graph_selected()
+
+    def on_watch_toggled(self, enabled):
+        """Кнопка слежения за дописыванием файла выбранного графика"""
+        if self.current_grapth_index is not None:
+            self.set_watch(self.graphs[self.current_grapth_index], enabled)
+        self.sync_watch_button()
+
+    def sync_watch_button(self):
+        """Состояние кнопки слежения для выбранного графика"""
+        watched = self.current_grapth_index is not None and self.graphs[self.current_grapth_index].graph_id in self.watched
+        self.watch_button.blockSignals(True)
+        self.watch_button.setChecked(watched)
+        self.watch_button.blockSignals(False)
+
+    def set_watch(self, graph_data, enabled):
+        """
+        Включить или выключить слежение за CSV графика. При включении файл перечитывается целиком
+        (он мог вырасти с момента загрузки), дальше разбираются только дописанные строки.
+        """
+        if not enabled:
+            self.watched.pop(graph_data.graph_id, None)
+            if not self.watched:
+                self.watch_timer.stop()
+            return
+        self.watched[graph_data.graph_id] = (graph_data, CsvTail(graph_data.file_path))
+        if self.poll_graph(graph_data) and not self.watch_timer.isActive():
+            self.watch_timer.start()
+
+    def poll_watched(self):
+        """Таймер слежения: дочитать все отслеживаемые файлы"""
+        for graph_id in list(self.watched):
+            self.poll_graph(self.watched[graph_id][0])
+
+    def poll_graph(self, graph_data):
+        """Дочитать новые строки файла графика и дописать их в график. Возвращает False, если слежение остановлено"""
+        _, tail = self.watched[graph_data.graph_id]
+        try:
+            result = tail.read()
+            if result is None:
+                return True
+            data, restarted = result
+            x = data.index.to_numpy(dtype=np.float64)
+            y = data.to_numpy(dtype=np.float64).T
+            if not restarted and len(data.columns) != len(graph_data.columns):
+                raise ValueError("число столбцов в новых строках не совпадает с заголовком")
+        except (OSError, ValueError) as e:
+            self.set_watch(graph_data, False)
+            self.sync_watch_button()
+            QMessageBox.warning(self, "Слежение остановлено", f"Не удалось дочитать файл {graph_data.file_path}: {e}")
+            return False
+
+        if not restarted:
+            self.append_graph_rows(graph_data, x, y)
+            return True
+        self.memory.touch(graph_data)
+        columns = tuple(str(col) for col in data.columns)
+        columns_changed = columns != graph_data.columns
+        graph_data.set_data(x, y, columns, data.index.name)
+        graph_data.set_dtype(STORAGE_DTYPE)
+        if columns_changed:
+            # Другие столбцы: кривые и таблица соединений окна строятся заново
+            graph_data.graphics_visible = [True] * len(columns)
+            self.species_index.remove(graph_data)
+            self.species_index.add(graph_data)
+            if graph_data.graph_id in self.views:
+                self.release_graph_window(graph_data)
+                if graph_data.show:
+                    self.show_graph(graph_data)
+        else:
+            self.rewrite_graph(graph_data)
+        return True
+
+    def append_graph_rows(self, graph_data, x, y):
+        """
+        Дописать строки в график и обновить окно: пересчитываются только точки видимых кривых, это
+        выборка видимого диапазона, и ее цена не зависит от длины данных. Если окно показывало конец
+        данных, диапазон X продлевается до новых строк.
+        """
+        self.memory.touch(graph_data)
+        x_end = graph_data.x[-1] if len(graph_data.x) else None
+        view = self.views.get(graph_data.graph_id)
+        view_range = view.field.getViewBox().viewRange()[0] if view is not None else None
+        graph_data.append_rows(x, y)
+        self.refresh_curves(graph_data)
+        if view_range is not None and x_end is not None and view_range[1] >= x_end and graph_data.x[-1] > x_end:
+            self.set_graph_range(graph_data, x_range=(view_range[0], view_range[1] + graph_data.x[-1] - x_end), padding=0)
+
+    def set_stream_server(self, enabled):
+        """Включить или выключить прием строк от расчетов на сокете STREAM_SOCKET_PATH"""
+        global STREAM_SERVER
+        if not enabled:
+            if self.stream_server is not None:
+                self.stream_server.close()
+                self.stream_server = None
+            for session in self.streams:
+                session.socket.abort()
+            self.streams.clear()
+            STREAM_SERVER = False
+            return
+        if self.stream_server is not None:
+            return
+        # Файл сокета может остаться от упавшего экземпляра; занятый другим экземпляром не трогаем
+        probe = QLocalSocket()
+        probe.connectToServer(STREAM_SOCKET_PATH)
+        busy = probe.waitForConnected(100)
+        probe.abort()
+        server = QLocalServer(self)
+        if not busy:
+            os.makedirs(os.path.dirname(STREAM_SOCKET_PATH), exist_ok=True)
+            QLocalServer.removeServer(STREAM_SOCKET_PATH)
+        if busy or not server.listen(STREAM_SOCKET_PATH):
+            error = "сокет занят другим окном программы" if busy else server.errorString()
+            server.deleteLater()
+            self.stream_action.blockSignals(True)
+            self.stream_action.setChecked(False)
+            self.stream_action.blockSignals(False)
+            QMessageBox.warning(self, "Прием строк", f"Не удалось открыть {STREAM_SOCKET_PATH}: {error}")
+            return
+        server.newConnection.connect(self.on_stream_connection)
+        self.stream_server = server
+        STREAM_SERVER = True
+
+    def on_stream_connection(self):
+        while self.stream_server.hasPendingConnections():
+            socket = self.stream_server.nextPendingConnection()
+            socket.setReadBufferSize(STREAM_READ_CHUNK)  # Иначе Qt читал бы из сокета без ограничения
+            session = StreamSession(socket)
+            socket.readyRead.connect(lambda session=session: self.read_stream(session))
+            socket.disconnected.connect(lambda session=session: self.close_stream(session))
+            self.streams.append(session)
+            self.read_stream(session)
+
+    def read_stream(self, session):
+        """
+        Разбор пришедших кадров соединения. Пачки строк копятся до кадра отрисовки; пока их больше
+        STREAM_PENDING_ROWS, байты остаются в сокете и дочитываются после кадра (apply_streams).
+        """
+        try:
+            while session.pending_rows < STREAM_PENDING_ROWS:
+                frame = session.decoder.next()
+                if frame is None:
+                    if not session.socket.isOpen():
+                        break  # Соединение закрыто после ошибки формата
+                    data = session.socket.read(STREAM_READ_CHUNK).data()
+                    if not data:
+                        break
+                    session.decoder.feed(data)
+                elif frame[0] == FRAME_HEADER:
+                    self.open_stream_graph(session, *frame[1:])
+                elif session.graph_data is not None:
+                    session.pending.append(frame[1:])
+                    session.pending_rows += len(frame[1])
+                    if not self.stream_timer.isActive():
+                        self.stream_timer.start()
+        except StreamError as e:
+            self.drop_stream_rows(session)
+            session.decoder = StreamDecoder()  # Остаток потока не разбирается
+            session.socket.abort()
+            QMessageBox.warning(self, "Прием строк", f"Соединение расчета закрыто: {e}")
+
+    def open_stream_graph(self, session, name, index_name, columns):
+        """
+        Заголовок потока: строки дописываются в график с тем же именем и столбцами, если он есть
+        в проекте (расчет переподключился), иначе создается новый пустой график.
+        """
+        self.flush_stream(session)  # Строки прежнего заголовка относятся к прежнему графику
+        for graph_data in self.graphs:
+            if graph_data.file_path == name and graph_data.columns == columns:
+                session.graph_data = graph_data
+                return
+        graph_data = GraphData.from_arrays(
+            {'index': np.empty(0), 'values': np.empty((len(columns), 0))}, columns, name, index_name)
+        graph_data.graphics_visible = [True] * len(columns)
+        session.graph_data = graph_data
+        self.attach_graph(graph_data)
+
+    def flush_stream(self, session):
+        """Дописать накопленные пачки соединения в его график одним куском"""
+        if not session.pending:
+            return
+        x = np.concatenate([batch[0] for batch in session.pending])
+        y = np.concatenate([batch[1] for batch in session.pending], axis=1)
+        graph_data = session.graph_data
+        self.drop_stream_rows(session)
+        is_empty = len(graph_data.x) == 0
+        self.append_graph_rows(graph_data, x, y)
+        if is_empty:
+            # Первые строки нового графика: масштаб по ним, как при загрузке CSV
+            finite = y[np.isfinite(y)]
+            graph_data.scale_x_min, graph_data.scale_x_max = float(graph_data.x[0]), float(graph_data.x[-1])
+            if len(finite):
+                graph_data.scale_y_min, graph_data.scale_y_max = float(finite.min()), float(finite.max())
+            self.set_graph_range(graph_data, x_range=(graph_data.scale_x_min, graph_data.scale_x_max),
+                                 y_range=(graph_data.scale_y_min, graph_data.scale_y_max))
+
+    def drop_stream_rows(self, session):
+        session.pending.clear()
+        session.pending_rows = 0
+
+    def detach_stream(self, session):
+        """График соединения удален из проекта: строки отбрасываются до следующего заголовка потока"""
+        self.drop_stream_rows(session)
+        session.graph_data = None
+
+    def apply_streams(self):
+        """Кадр отрисовки потоков: дописать накопленные строки и дочитать приостановленные сокеты"""
+        for session in list(self.streams):
+            if session.graph_data is not None:
+                self.flush_stream(session)
+        for session in list(self.streams):
+            self.read_stream(session)
+            if session.closed and not session.pending and not session.socket.bytesAvailable():
+                self.streams.remove(session)
+                session.socket.deleteLater()
+
+    def close_stream(self, session):
+        """Расчет отключился: прочитанные строки еще допишутся на кадре отрисовки"""
+        session.closed = True
+        if not self.stream_timer.isActive():
+            self.stream_timer.start()
+
+    def apply_species_query(self, action):
+        """
+        Показать ('show'), скрыть ('hide'), оставить только ('only') или выделить ('highlight')
+        соединения из строки поиска во всех графиках. Каждое окно перерисовывается один раз.
+        """
+        matches = self.species_index.find(self.species_input.text())
+        if not matches:
+            QMessageBox.information(self, "Поиск соединений", "Подходящих соединений не найдено")
+            return
+        for graph_data in self.graphs:
+            columns = matches.get(graph_data.graph_id, [])
+            view = self.views.get(graph_data.graph_id)
+            if action == 'highlight':
+                if view is not None:
+                    self.select_species(graph_data, columns)
+                continue
+            if not columns and action != 'only':
+                continue
+            visible = [False] * len(graph_data.columns) if action == 'only' else list(graph_data.graphics_visible)
+            for i in columns:
+                visible[i] = action != 'hide'
+            if view is not None:
+                view.table.model().set_visibility(visible)
+            else:
+                graph_data.graphics_visible = visible  # Окно еще не создано, кривые построятся при показе
+
+    def select_species(self, graph_data, columns):
+        """Выделить в таблице окна строки столбцов columns одним изменением выделения"""
+        table = self.views[graph_data.graph_id].table
+        model = table.model()
+        selection = QItemSelection()
+        start = None
+        for position, i in enumerate(columns):
+            if start is None:
+                start = i
+            if position + 1 == len(columns) or columns[position + 1] != i + 1:  # Конец непрерывного участка
+                selection.select(model.index(start + 1, 1), model.index(i + 1, 1))
+                start = None
+        table.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+
+    def show_top_graphs(self, graph_data, count):
+        """Оставить видимыми только count соединений с наибольшим максимумом (по статистике столбцов)"""
+        top = set(graph_data.top_columns(count))
+        self.views[graph_data.graph_id].table.model().set_visibility([i in top for i in range(len(graph_data.columns))])
 
     def show_graph(self, graph_data):
         """Показать график в новом окне с возможностью выбора отображаемых соединений"""
-        graph_data.graph_window = QMainWindow(self)
-        graph_data.graph_window.setWindowTitle(graph_data.file_name)
-        graph_data.graph_window.setGeometry(100, 100, 800, 400)  # Увеличим ширину окна
-
-        # Создаем главный виджет с разделителем
-        splitter = QSplitter()
-        graph_data.graph_window.setCentralWidget(splitter)
-
-        # Левый виджет с графиком
-        plot_widget = pg.PlotWidget()
-        graph_data.graph_field = plot_widget  # Сохраняем поле графика
-        plot_widget.setBackground("w")
+        graph_data.show = True  # Устанавливаем статус графика как отображаемого (до touch: показанные не выгружаются)
+        self.memory.touch(graph_data)
+        self.apply_pending_dtype(graph_data)
+        if GRID_MODE:
+            plot_widget = pg.PlotItem(title=graph_data.file_name)  # Ячейка общей сетки (GraphGrid)
+        else:
+            plot_widget = pg.PlotWidget()
+            plot_widget.setBackground("w")
+        view = self.views[graph_data.graph_id] = GraphView(field=plot_widget)
         plot_widget.setLabel('left', graph_data.units_list[graph_data.unit_final], units='')  # Подпись для оси Y
         plot_widget.setLabel('bottom', 'x', units='')  # Подпись для оси X
-        splitter.addWidget(plot_widget)
-
-        graph_data.graph_window.plot_widget = plot_widget  # Сохраняем ссылку в graph_window, чтобы менять масштаб!!!
-        # graph_window.plot_widget.setXRange(x_min, x_max) - так менять!
-        # graph_window.plot_widget.setYRange(y_min, y_max)
-
-        # Правый виджет с таблицей чекбоксов
-        table_widget = QTableWidget()
-        graph_data.graph_table = table_widget  # Сохраняем ссылку на таблицу
-        table_widget.setColumnCount(2)
-        table_widget.setHorizontalHeaderLabels(["", "Соединение"])
-        table_widget.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
-        table_widget.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+
+        # Правый виджет с таблицей чекбоксов: строки создаются представлением только для видимой части
+        table_widget = QTableView()
+        view.table = table_widget
+        species_model = SpeciesModel(graph_data, table_widget)
+        table_widget.setModel(species_model)
+        # Размеры строк и столбцов фиксированы: подгонка под содержимое опрашивала бы все строки
+        table_widget.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         table_widget.verticalHeader().setVisible(False)  # Отключаем нумерацию строк
-        splitter.addWidget(table_widget)
-
-        # Инициализация таблицы с чекбоксами
-        connections = graph_data.data.columns
-        table_widget.setRowCount(len(connections) + 1)  # На одну строку больше для общего чекбокса "Все"
-
-        # Создаем общий чекбокс "Все"
-        all_checkbox = QCheckBox()
-        all_checkbox.setChecked(all(graph_data.graphics_visible))  # Устанавливаем в зависимости от всех графиков
-        all_checkbox.stateChanged.connect(
-            lambda state: self.toggle_all_graphs_visibility(state, graph_data, table_widget))
-        table_widget.setCellWidget(0, 0, all_checkbox)
-        table_widget.setItem(0, 1, QTableWidgetItem("Все"))
-
-        # Создаем чекбоксы для каждого соединения
-        for i, col_name in enumerate(connections):
-            # Создаем чекбокс и устанавливаем его состояние из graphics_visible
-            checkbox = QCheckBox()
-            checkbox.setChecked(graph_data.graphics_visible[i])
-            checkbox.stateChanged.connect(
-                lambda state, idx=i: self.toggle_individual_graph_visibility(state, idx, graph_data, plot_widget))
-            table_widget.setCellWidget(i + 1, 0, checkbox)  # Первая строка - общий чекбокс, поэтому i+1
-            table_widget.setItem(i + 1, 1, QTableWidgetItem(col_name))
-
-        # Построение графиков для каждой колонки, заменяя NaN на 0
-        x_values = graph_data.data.index
-        data_filled = graph_data.data.fillna(0)  # Заменяем NaN на 0 для всех колонок
+        table_widget.horizontalHeader().setSectionResizeMode(0, QHeaderView.Fixed)
+        table_widget.horizontalHeader().resizeSection(0, table_widget.verticalHeader().defaultSectionSize())
+        table_widget.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        species_model.visibility_changed.connect(lambda columns: self.restyle_curves(graph_data, columns))
+
+        # Фильтр над таблицей: показать только соединения с наибольшим пиком
+        top_spin_box = QSpinBox()
+        top_spin_box.setRange(1, max(len(graph_data.columns), 1))
+        top_spin_box.setValue(min(TOP_GRAPHS_COUNT, top_spin_box.maximum()))
+        top_button = QPushButton("Показать с наибольшим пиком")
+        top_button.clicked.connect(lambda: self.show_top_graphs(graph_data, top_spin_box.value()))
+        top_layout = QHBoxLayout()
+        top_layout.addWidget(top_spin_box)
+        top_layout.addWidget(top_button)
+        species_widget = QWidget()
+        species_layout = QVBoxLayout(species_widget)
+        species_layout.setContentsMargins(0, 0, 0, 0)
+        species_layout.addLayout(top_layout)
+        species_layout.addWidget(table_widget)
+
+        if GRID_MODE:
+            view.window = self.graph_grid.add(plot_widget, species_widget)
+        else:
+            view.window = QMainWindow(self)
+            view.window.setWindowTitle(graph_data.file_name)
+            view.window.setGeometry(100, 100, 800, 400)  # Увеличим ширину окна
+            # Создаем главный виджет с разделителем: слева график, справа таблица соединений
+            splitter = QSplitter()
+            view.window.setCentralWidget(splitter)
+            splitter.addWidget(plot_widget)
+            splitter.addWidget(species_widget)
 
         # Подключаем сигнал `selectionChanged` к обработчику
         table_widget.selectionModel().selectionChanged.connect(
@@ -955,27 +2016,34 @@ class MainWindow(QMainWindow):
                                                                    plot_widget)
         )
 
-        for i, col in enumerate(data_filled.columns):
-            column_data = data_filled[col]
-            # Добавляем легенду
-            # plot_widget.addLegend()
-            plot = plot_widget.plot(
-                column_data.index.values,
-                column_data.values,
-                pen=pg.mkPen(color="gray", width=2),
-                name=col
-            )
-            plot.setVisible(graph_data.graphics_visible[i])  # Устанавливаем видимость из graphics_visible
-            graph_data.graphics_visible[i] = True  # Включаем все графики по умолчанию
-
-        # # Установка диапазонов осей X и Y на основе масштабов графика
-        # plot_widget.setXRange(self.scale_x_min, self.scale_x_max)
-        # plot_widget.setYRange(self.scale_y_min, self.scale_y_max)
+        # Окно может создаваться позже загрузки графика: применяем сохраненный в GraphData масштаб.
+        # Масштаб задается до построения кривых, чтобы они сразу строились под видимый диапазон
+        plot_widget.setXRange(graph_data.scale_x_min, graph_data.scale_x_max)
+        plot_widget.setYRange(graph_data.scale_y_min, graph_data.scale_y_max)
+
+        # Точки кривых пересчитываются при изменении диапазона и размера окна; серия изменений
+        # за один проход цикла событий (панорамирование, масштаб колесом) дает один пересчет
+        refresh_timer = QTimer(plot_widget)
+        refresh_timer.setSingleShot(True)
+        refresh_timer.timeout.connect(lambda: self.refresh_curves(graph_data))
+        plot_widget.getViewBox().sigXRangeChanged.connect(lambda *args: refresh_timer.start(0))
+        plot_widget.getViewBox().sigXRangeChanged.connect(
+            lambda view_box, x_range: self.on_x_range_changed(graph_data, x_range))
+        plot_widget.getViewBox().sigResized.connect(lambda *args: refresh_timer.start(0))
+
+        # Построение графиков для каждой колонки: кривые создаются один раз, дальше у них меняются
+        # только стиль, видимость и точки. Здесь кривые создаются без точек: их за один проход заполнит
+        # refresh_curves, который все равно запустится после показа окна и изменения его размера
+        # plot_widget.addLegend()
+        view.curves = CurveSet(plot_widget, graph_data.columns)
+        for i in range(len(graph_data.columns)):
+            view.curves.set_style(i, self.curve_style(graph_data, i))
+        view.curves.update()
+        refresh_timer.start(0)
 
         # Устанавливаем событие на закрытие окна
-        graph_data.graph_window.closeEvent = lambda event: self.on_graph_window_closed(graph_data)
-        graph_data.show = True  # Устанавливаем статус графика как отображаемого
-        graph_data.graph_window.show()
+        view.window.closeEvent = lambda event: self.on_graph_window_closed(graph_data)
+        view.window.show()
 
     # def rewrite_graph(self, graph_data):
     #     # 1. Очистка виджета графиков перед перерисовкой
@@ -1023,127 +2091,91 @@ class MainWindow(QMainWindow):
     #         plot.setZValue(z_value)
 
     def rewrite_graph(self, graph_data):
-        # 1. Очистка виджета графиков перед перерисовкой
-        graph_data.graph_field.clear()
-
-        # 2. Перерисовка графиков с учетом свойства graphics_visible и выделения
-        for i, col_name in enumerate(graph_data.data.columns):
-            # Устанавливаем цвет графика:
-            # - "red", если выделено
-            # - "gray", если видимо, но не выделено
-            # - цвет фона "w", если не видимо
-            if graph_data.graphics_visible[i]:
-                color = "gray"  # Цвет по умолчанию
-                z_value = 1  # Верхний слой
-                if graph_data.graph_table.item(i + 1, 1) in graph_data.graph_table.selectedItems():
-                    color = "red"  # Если график выбран в таблице, делаем его красным
-                    z_value = 2  # самый Верхний слой
-            else:
-                color = "w"  # Цвет фона для невидимых графиков
-                z_value = 0  # Нижний слой
-
-            # Получаем данные
-            column_data = graph_data.data[col_name]
-
-            # Убираем NaN: сохраняем только индексы, где значения не являются NaN
-            # print('column_data=', column_data)
-            valid_indices = ~column_data.isna()
-            valid_x = column_data.index.values[valid_indices]
-            valid_y = column_data.values[valid_indices]
-
-            # Преобразуем значения по оси Y с использованием функций f1 и f2
-            transformed_y = graph_data.unit_from[graph_data.unit_initial](
-                graph_data.unit_to[graph_data.unit_final](valid_y))
-
-            # Применяем преобразования только к значениям, не равным 0
-            # transformed_y = np.where(
-            #     valid_y != 0,  # Условие: если значение не равно 0
-            #     graph_data.unit_from[graph_data.unit_initial](
-            #         graph_data.unit_to[graph_data.unit_final](valid_y)
-            #     ),
-            #     valid_y  # Если значение равно 0, оставляем его без изменений
-            # )
-
-            # Строим график с преобразованными данными
-            plot = graph_data.graph_field.plot(
-                valid_x,  # Ось X только для валидных данных
-                transformed_y,  # Преобразованные значения по оси Y
-                pen=pg.mkPen(color=color, width=2),
-                name=col_name
-            )
-
-            # Устанавливаем Z-value: белые графики будут под остальными
-            plot.setZValue(z_value)
+        """Обновление стиля и точек всех кривых окна (после замены данных графика)"""
+        if graph_data.graph_id not in self.views:
+            return  # Окно еще не создано, график будет построен при первом показе
+        self.restyle_curves(graph_data, range(len(graph_data.columns)))
+        self.refresh_curves(graph_data)
+
+    def curve_style(self, graph_data, i):
+        """
+        Стиль кривой столбца i: (цвет, z) или None, если кривая скрыта.
+        - HIGHLIGHT_STYLE (красный), если выделено
+        - CURVE_STYLE (серый), если видимо, но не выделено
+        """
+        if not graph_data.graphics_visible[i]:
+            return None
+        table = self.views[graph_data.graph_id].table
+        if table.selectionModel().isSelected(table.model().index(i + 1, 1)):  # Первая строка - общий чекбокс "Все"
+            return HIGHLIGHT_STYLE
+        return CURVE_STYLE
+
+    def restyle_curves(self, graph_data, columns):
+        """Меняет перо, z и видимость только тех кривых из columns, у которых изменился стиль"""
+        view = self.views.get(graph_data.graph_id)
+        if view is None:
+            return
+        self.memory.touch(graph_data)
+        for i in columns:
+            if view.curves.set_style(i, self.curve_style(graph_data, i)):
+                self.set_curve_data(graph_data, i)
+        view.curves.update()
+
+    def refresh_curves(self, graph_data):
+        """Пересчет точек видимых кривых после изменения диапазона, размера окна или единиц"""
+        view = self.views.get(graph_data.graph_id)
+        if view is None:
+            return
+        self.memory.touch(graph_data)
+        for i, style in enumerate(view.curves.styles):
+            if style:
+                self.set_curve_data(graph_data, i)
+        view.curves.update()
+
+    def set_curve_data(self, graph_data, i):
+        """
+        Точки кривой столбца i в выбранных единицах. В кривую передаются не все строки файла, а примерно
+        LOD_POINTS_PER_PIXEL точек на пиксель видимого диапазона.
+        """
+        view = self.views[graph_data.graph_id]
+        view_box = view.field.getViewBox()
+        (x_min, x_max), _ = view_box.viewRange()
+        points = max(int(view_box.width()), 1) * LOD_POINTS_PER_PIXEL
+        x_values, y_values, connect = graph_data.column_view(i, x_min, x_max, points, graph_data.unit_transform)
+        view.curves.set_points(i, x_values, y_values, connect)
 
     def on_selection_changed(self, selected, deselected, table_widget, graph_data, plot_widget):
-        """Обработка изменения выделения строк в таблице выбора графиков"""
-
-        # 1. Очистка виджета графиков перед перерисовкой
-        plot_widget.clear()
-
-        # 2. Перерисовка графиков с учетом свойства graphics_visible и выделения
-        for i, col_name in enumerate(graph_data.data.columns):
-            # Устанавливаем цвет графика:
-            # - "red", если выделено
-            # - "gray", если видимо, но не выделено
-            # - цвет фона "w", если не видимо
-            if graph_data.graphics_visible[i]:
-                color = "gray"  # Цвет по умолчанию
-                z_value = 1  # Верхний слой
-                if table_widget.item(i + 1, 1) in table_widget.selectedItems():
-                    color = "red"  # Если график выбран в таблице, делаем его красным
-                    z_value = 2  # самый Верхний слой
-            else:
-                color = "w"  # Цвет фона для невидимых графиков
-                z_value = 0  # Нижний слой
-
-            # Получаем данные и строим график с выбранным цветом
-            column_data = graph_data.data[col_name].fillna(0)
-            plot = plot_widget.plot(
-                column_data.index.values,
-                column_data.values,
-                pen=pg.mkPen(color=color, width=2),
-                name=col_name
-            )
+        """Обработка изменения выделения строк в таблице выбора графиков: перекрашиваются только затронутые кривые"""
+        rows = {index.row() for index in selected.indexes()} | {index.row() for index in deselected.indexes()}
+        rows.discard(0)
+        self.restyle_curves(graph_data, sorted(row - 1 for row in rows))
 
-            # Устанавливаем Z-value: белые графики будут под остальными
-            plot.setZValue(z_value)
-
-        # 3. Проверка, выбрана ли строка "Все" (первая строка)
-        if table_widget.item(0, 1) in table_widget.selectedItems():
+        # Проверка, выбрана ли строка "Все" (первая строка)
+        if table_widget.selectionModel().isSelected(table_widget.model().index(0, 1)):
             # Если выбрана строка "Все", выделяем все строки в таблице
             table_widget.selectAll()
 
-    def toggle_graph_visibility(self, graph_data, state, row_position):
+    def toggle_graph_visibility(self, graph_data, is_visible):
         """Переключение видимости окна графика и обновление состояния GraphData"""
-        state = Qt.CheckState(state)
-        if state == Qt.CheckState.Checked:
-            if not graph_data.graph_window:
+        view = self.views.get(graph_data.graph_id)
+        if is_visible:
+            if view is None:
                 self.show_graph(graph_data)
             else:
-                graph_data.graph_window.show()
+                if self.apply_pending_dtype(graph_data):
+                    self.rewrite_graph(graph_data)  # Кривые окна держат ссылки на старый блок данных
+                view.window.show()
+                self.apply_pending_ranges([graph_data.graph_id])  # Диапазоны, заданные, пока окно было скрыто
             graph_data.show = True  # Обновляем состояние в GraphData
         else:
-            if graph_data.graph_window:
-                graph_data.graph_window.hide()
+            if view is not None:
+                view.window.hide()
             graph_data.show = False  # Обновляем состояние в GraphData
 
-    def toggle_graph_scaleble(self, graph_data, state, row_position):
-        state = Qt.CheckState(state)
-        if state == Qt.CheckState.Checked:
-            graph_data.scalable = True
-        else:
-            graph_data.scalable = False
-
     def on_graph_window_closed(self, graph_data):
         """Обработчик закрытия окна графика через системную кнопку"""
         graph_data.show = False  # Обновляем состояние GraphData при закрытии окна
-        for row in range(self.table.rowCount()):
-            # Находим строку, соответствующую данному графику, и снимаем галочку
-            if self.table.item(row, 0).text() == graph_data.file_name:
-                checkbox = self.table.cellWidget(row, 1)
-                checkbox.setChecked(False)
-                break
+        self.graph_list.refresh(graph_data)  # Снимаем галочку в строке этого графика
 
     def screen_save_img(self):
         """ Сохранение изображения графика """
@@ -1157,7 +2189,13 @@ class MainWindow(QMainWindow):
             return
 
         for i in self.graphs:
-            if active_window.windowTitle() == i.file_name:
+            view = self.views.get(i.graph_id)
+            if GRID_MODE:
+                # В сетке сохраняется выбранная щелчком ячейка
+                is_active = active_window is self and view is not None and view.window is self.graph_grid.current
+            else:
+                is_active = view is not None and active_window.windowTitle() == i.file_name
+            if is_active:
                 # Открываем диалог для выбора пути и имени файла
                 file_path, _ = QFileDialog.getSaveFileName(
                     self,
@@ -1172,7 +2210,7 @@ class MainWindow(QMainWindow):
                 if not file_path.endswith(".png"):
                     file_path += ".png"
                 # Создаем ImageExporter
-                exporter = ImageExporter(i.graph_field.plotItem)
+                exporter = ImageExporter(view.field if GRID_MODE else view.field.plotItem)
                 # Устанавливаем размер изображения (опционально)
                 # exporter.parameters()['width'] = 1024  # Установите нужную ширину
                 try:
@@ -1186,8 +2224,193 @@ class MainWindow(QMainWindow):
                         "Изображение не сохранено"
                     )
 
+_RENDER_APP = None  # QApplication процесса пакетной отрисовки
+_RENDER_SOURCE = (None, None)  # Последний прочитанный процессом файл: (путь, список GraphData)
+
+
+def render_graph(graph_data, file_path, width=RENDER_SIZE[0], height=RENDER_SIZE[1]):
+    """
+    Рисует график без окна так же, как окно графика (видимые столбцы, масштаб и единицы
+    из GraphData), и сохраняет его в PNG
+    """
+    plot_widget = pg.PlotWidget(title=graph_data.file_name)
+    plot_widget.setBackground("w")
+    # Размер раскладки применяется только к показанному виджету; на экран он не выводится
+    plot_widget.setAttribute(Qt.WA_DontShowOnScreen)
+    plot_widget.resize(width, height)
+    plot_widget.show()
+    plot_widget.setLabel('left', graph_data.units_list[graph_data.unit_final], units='')
+    plot_widget.setLabel('bottom', 'x', units='')
+    plot_widget.setXRange(graph_data.scale_x_min, graph_data.scale_x_max)
+    plot_widget.setYRange(graph_data.scale_y_min, graph_data.scale_y_max)
+    (x_min, x_max), _ = plot_widget.getViewBox().viewRange()
+    points = width * LOD_POINTS_PER_PIXEL
+    curves = CurveSet(plot_widget, graph_data.columns)
+    for i, visible in enumerate(graph_data.graphics_visible):
+        curves.set_style(i, CURVE_STYLE if visible else None)
+        if visible:
+            curves.set_points(i, *graph_data.column_view(i, x_min, x_max, points, graph_data.unit_transform))
+    curves.update()
+    exporter = ImageExporter(plot_widget.plotItem)
+    exporter.parameters()['width'] = width
+    if not exporter.export(file_path):  # QImage.save сообщает об ошибке записи только результатом
+        raise OSError(f"Не удалось записать {file_path}")
+    plot_widget.close()
+
+
+def read_render_source(file_path):
+    """Графики файла: проекта .sgr или одного CSV"""
+    if file_path.lower().endswith(".sgr"):
+        graphs, _ = read_project(file_path)
+        return graphs
+    return [load_csv_file(file_path)]
+
+
+def apply_render_options(graph_data, options):
+    """Переопределяет масштаб, единицы и видимые соединения графика параметрами командной строки"""
+    changed = False
+    if options.unit_from is not None:
+        graph_data.unit_initial = UNITS.index(options.unit_from)
+        changed = True
+    if options.unit_to is not None:
+        graph_data.unit_final = UNITS.index(options.unit_to)
+        changed = True
+    if options.x_min is not None or options.x_max is not None:
+        if options.x_min is not None:
+            graph_data.scale_x_min = options.x_min
+        if options.x_max is not None:
+            graph_data.scale_x_max = options.x_max
+        changed = True
+    if options.species:
+        index = SpeciesIndex()
+        index.add(graph_data)
+        visible = set()
+        for query in options.species:
+            visible.update(index.find(query).get(graph_data.graph_id, []))
+        graph_data.graphics_visible = [i in visible for i in range(len(graph_data.columns))]
+        changed = True
+    if options.top is not None:
+        order = [i for i in graph_data.top_columns(len(graph_data.columns)) if graph_data.graphics_visible[i]]
+        top = set(order[:options.top])
+        graph_data.graphics_visible = [i in top for i in range(len(graph_data.columns))]
+        changed = True
+    if options.y_min is not None or options.y_max is not None:
+        if options.y_min is not None:
+            graph_data.scale_y_min = options.y_min
+        if options.y_max is not None:
+            graph_data.scale_y_max = options.y_max
+    elif changed:
+        # Сохраненный масштаб Y относится к прежним диапазону, единицам и соединениям
+        y_range = graph_data.visible_y_range(graph_data.scale_x_min, graph_data.scale_x_max)
+        if y_range is not None and np.isfinite(y_range).all():
+            graph_data.scale_y_min, graph_data.scale_y_max = y_range
+
+
+def _init_render_process():
+    """Инициализация процесса пакетной отрисовки: Qt без экрана"""
+    global _RENDER_APP
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    _RENDER_APP = QApplication.instance() or QApplication([])
+
+
+def render_job(source_path, graph_index, output_path, options):
+    """Задача процесса пакетной отрисовки: один график файла source_path в output_path"""
+    global _RENDER_SOURCE
+    # Задачи одного проекта идут подряд, поэтому процесс читает (отображает в память) проект один раз
+    if _RENDER_SOURCE[0] != source_path:
+        _RENDER_SOURCE = (None, None)
+        _RENDER_SOURCE = (source_path, read_render_source(source_path))
+    graph_data = _RENDER_SOURCE[1][graph_index]
+    apply_render_options(graph_data, options)
+    render_graph(graph_data, output_path, options.width, options.height)
+    return output_path
+
+
+def render_jobs(sources, output_dir):
+    """Список задач (файл, номер графика, путь PNG); одинаковые имена графиков получают суффикс _2, _3..."""
+    jobs = []
+    names = set()
+    for source_path in sources:
+        if source_path.lower().endswith(".sgr"):
+            graphs, _ = read_project(source_path)
+            file_names = [graph_data.file_name for graph_data in graphs]
+            del graphs
+        else:
+            file_names = [os.path.splitext(os.path.basename(source_path))[0]]
+        for graph_index, file_name in enumerate(file_names):
+            name, number = file_name, 1
+            while name in names:
+                number += 1
+                name = f"{file_name}_{number}"
+            names.add(name)
+            jobs.append((source_path, graph_index, os.path.join(output_dir, name + ".png")))
+    return jobs
+
+
+def render_main(argv):
+    """
+    Пакетная отрисовка без главного окна: python main.py render файлы... -o папка.
+    Каждый график каждого CSV или проекта .sgr сохраняется в PNG; графики рисуются параллельно
+    в пуле процессов с Qt без экрана (offscreen). Возвращает код завершения.
+    """
+    parser = argparse.ArgumentParser(prog="main.py render", description="Сохранение графиков в PNG без окна")
+    parser.add_argument("sources", nargs="+", help="файлы CSV и проекты .sgr")
+    parser.add_argument("-o", "--output", default=".", help="папка для изображений")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument("--width", type=int, default=RENDER_SIZE[0])
+    parser.add_argument("--height", type=int, default=RENDER_SIZE[1])
+    parser.add_argument("--x-min", type=float)
+    parser.add_argument("--x-max", type=float)
+    parser.add_argument("--y-min", type=float, help="по умолчанию - по видимым соединениям")
+    parser.add_argument("--y-max", type=float)
+    parser.add_argument("--unit-from", choices=UNITS, help="левая единица строки \"Изменение размерности Y\"")
+    parser.add_argument("--unit-to", choices=UNITS, help="правая единица строки \"Изменение размерности Y\"")
+    parser.add_argument("--species", action="append",
+                        help="показать только эти соединения: имя, префикс SiO2* или шаблон *SO4* (можно повторять)")
+    parser.add_argument("--top", type=int, help="показать только столько соединений с наибольшим пиком")
+    options = parser.parse_args(argv)
+
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"  # Процессы пула наследуют окружение
+    os.makedirs(options.output, exist_ok=True)
+    try:
+        jobs = render_jobs(options.sources, options.output)
+    except Exception as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    errors = 0
+    if options.jobs <= 1:
+        _init_render_process()
+        for done_count, (source_path, graph_index, output_path) in enumerate(jobs, start=1):
+            try:
+                render_job(source_path, graph_index, output_path, options)
+                print(f"[{done_count}/{len(jobs)}] {output_path}")
+            except Exception as e:
+                errors += 1
+                print(f"{source_path} [{graph_index}]: {e}", file=sys.stderr)
+        return 1 if errors else 0
+
+    # spawn, как и при загрузке CSV: каждому процессу нужен свой QApplication
+    with ProcessPoolExecutor(
+        max_workers=min(options.jobs, len(jobs)) or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_render_process
+    ) as pool:
+        futures = {pool.submit(render_job, *job, options): job for job in jobs}
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            source_path, graph_index, output_path = futures[future]
+            try:
+                future.result()
+                print(f"[{done_count}/{len(jobs)}] {output_path}")
+            except Exception as e:
+                errors += 1
+                print(f"{source_path} [{graph_index}]: {e}", file=sys.stderr)
+    return 1 if errors else 0
+
+
 # Запуск приложения
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "render":
+        sys.exit(render_main(sys.argv[2:]))
     app = QApplication(sys.argv)
     main_window = MainWindow()
     main_window.show()